@@ -1,8 +1,20 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory
+import itertools
+import logging
+import time
 from flask_cors import CORS
 import os
+from datetime import date
 from dotenv import load_dotenv
+from flask.json.provider import DefaultJSONProvider
 from database import Database
+from queries import PRODUCT_FORMATS, parse_product_filters, parse_sort
+import fast_json
+import compression
+import log_config
+import metrics
+import replicas
+from product_io import CONTENT_TYPES, FORMATS, detect_format, encode_export, read_records
 
 # Load .env file with explicit encoding
 # Try to read .env file manually with proper encoding
@@ -62,49 +74,218 @@ def load_env_safely():
         load_dotenv()
 
 load_env_safely()
+log_config.setup_logging()
+logger = logging.getLogger('app')
 
 app = Flask(__name__, static_folder='.', static_url_path='')
 CORS(app, resources={r"/api/*": {"origins": "*"}})
+fast_json.install(app, DefaultJSONProvider)
+
+# Static files compressed once and served from memory
+static_assets = compression.StaticAssets(app.root_path).load()
 
 # Initialize database
 db = Database()
 
+# Values read at scrape time by /metrics
+def pool_connections():
+    stats = db.get_pool_stats()
+    return {(state,): stats[state] for state in ('in_use', 'idle', 'max') if state in stats}
+
+metrics.register_callback('db_pool_connections', 'Pool connections by state', 'gauge', ('state',), pool_connections)
+metrics.register_callback(
+    'cache_requests_total', 'Query cache lookups', 'counter', ('cache', 'result'),
+    metrics.cache_counters({'chart': db.query_cache, 'search': db.search_cache})
+)
+metrics.register_callback(
+    'log_records_dropped_total', 'Log records dropped because the queue was full', 'counter', (),
+    lambda: {(): log_config.dropped_records()}
+)
+
+def not_modified(etag):
+    """Return a 304 response if the client already has `etag`, otherwise None"""
+    if etag and request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        return with_etag(response, etag)
+    return None
+
+def with_etag(response, etag):
+    """Attach a weak ETag and ask clients to revalidate before reusing the body"""
+    if etag:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.before_request
+def route_reads():
+    # A client that wrote within DB_READ_YOUR_WRITES seconds reads from the
+    # primary, whichever worker serves it
+    replicas.pin_primary(replicas.PRIMARY_COOKIE in request.cookies)
+    # The ETag's data version and the rows must come from the same server
+    replicas.hold_replica()
+
+@app.after_request
+def remember_write(response):
+    max_age = db.replica_set.cookie_max_age
+    if max_age and request.method in replicas.WRITE_METHODS and response.status_code < 400:
+        response.set_cookie(replicas.PRIMARY_COOKIE, '1', max_age=max_age, httponly=True, samesite='Lax')
+    return response
+
+@app.after_request
+def log_request(response):
+    """Sampled access record (LOG_SAMPLE) and latency histogram, timed after compression"""
+    started = g.get('started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else None
+        duration = time.perf_counter() - started
+        metrics.observe_request(route, request.method, response.status_code, duration)
+        log_config.log_request(route, request.method, request.path, response.status_code, duration)
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip / brotli for JSON and text responses above COMPRESS_MIN_SIZE"""
+    encoding = compression.choose_encoding(request.accept_encodings)
+    if compression.wants_compression(response, encoding):
+        compression.apply_compression(response, response.get_data(), encoding)
+    return response
+
+def data_etag(name):
+    """ETag for a response that depends only on the products table"""
+    version = db.get_data_version()
+    return f'{name}-{version}' if version else None
+
+def positive_int_arg(name, default):
+    """Integer query parameter >= 1 (raises ValueError, answered with a 400)"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f'"{name}" must be an integer')
+    if number < 1:
+        raise ValueError(f'"{name}" must be at least 1')
+    return number
+
+def snapshot_etag(name, snapshot):
+    """ETag of a chart snapshot: the data version it was computed at, not the current one"""
+    return f'{name}-{snapshot.version}' if snapshot.version else None
+
 @app.route('/api/products', methods=['GET'])
 def get_products():
     try:
-        page = int(request.args.get('page', 1))
+        etag = data_etag('products')
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
         limit = int(request.args.get('limit', 10))
+        # ?format=raw: numeric amount and ISO date instead of display strings
+        fmt = request.args.get('format') or None
+        if fmt is not None and fmt not in PRODUCT_FORMATS:
+            return jsonify({'error': f'Unsupported format, use one of: {", ".join(PRODUCT_FORMATS)}'}), 400
+        # Whitelisted filters (?category=Books,Food&date_from=...) and ?sort=-date
+        try:
+            filters = parse_product_filters(request.args)
+            sort = request.args.get('sort') or None
+            parse_sort(sort)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Cursor mode: ?after=<cursor> / ?before=<cursor> (empty after= means first page)
+        if 'after' in request.args or 'before' in request.args:
+            try:
+                result = db.get_products_by_cursor(
+                    limit,
+                    after=request.args.get('after') or None,
+                    before=request.args.get('before') or None,
+                    fmt=fmt,
+                    filters=filters,
+                    sort=sort
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            total, total_exact = db.count_products(filters=filters)
+
+            logger.debug('Returning products (cursor)', extra={'rows': len(result['data']), 'total': total})
+
+            return with_etag(jsonify({
+                'data': result['data'],
+                'pagination': {
+                    'limit': limit,
+                    'total': total,
+                    'totalExact': total_exact,
+                    'totalPages': (total + limit - 1) // limit,
+                    'nextCursor': result['next_cursor'],
+                    'prevCursor': result['prev_cursor']
+                }
+            }), etag)
+
+        page = int(request.args.get('page', 1))
         offset = (page - 1) * limit
 
-        products = db.get_products(limit, offset)
-        total = db.get_total_products()
+        products = db.get_products(limit, offset, fmt=fmt, filters=filters, sort=sort)
+        total, total_exact = db.count_products(filters=filters)
         
-        print(f'API: Returning {len(products)} products, total: {total}')
+        logger.debug('Returning products', extra={'rows': len(products), 'total': total})
 
-        return jsonify({
+        return with_etag(jsonify({
             'data': products,
             'pagination': {
                 'page': page,
                 'limit': limit,
                 'total': total,
+                'totalExact': total_exact,
                 'totalPages': (total + limit - 1) // limit
             }
-        })
+        }), etag)
     except Exception as e:
-        print(f'Error fetching products: {e}')
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error fetching products: %s', e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/products/search', methods=['GET'])
+def search_products():
+    """Typeahead search by name: ?q=lap&limit=10 (prefix matches first, then substring)"""
+    try:
+        fmt = request.args.get('format') or None
+        if fmt is not None and fmt not in PRODUCT_FORMATS:
+            return jsonify({'error': f'Unsupported format, use one of: {", ".join(PRODUCT_FORMATS)}'}), 400
+        
+        q = request.args.get('q', '')
+        result = db.search_products(q, request.args.get('limit', type=int), fmt=fmt)
+        # partial: the SEARCH_TIMEOUT_MS budget ran out before all matches were found
+        return jsonify({'query': q.strip(), 'data': result['data'], 'partial': result['partial']})
+    except Exception as e:
+        logger.error('Error searching products: %s', e)
+        return jsonify({'error': 'Failed to search products'}), 500
+
 @app.route('/api/products/<int:product_id>', methods=['GET'])
 def get_product(product_id):
     try:
-        product = db.get_product_by_id(product_id)
+        fmt = request.args.get('format') or None
+        if fmt is not None and fmt not in PRODUCT_FORMATS:
+            return jsonify({'error': f'Unsupported format, use one of: {", ".join(PRODUCT_FORMATS)}'}), 400
+        
+        # Revalidation only needs the row version, not the formatted row
+        if request.if_none_match:
+            row_version = db.get_product_version(product_id)
+            if row_version is None:
+                return jsonify({'error': 'Product not found'}), 404
+            cached = not_modified(f'product-{product_id}-{row_version}')
+            if cached:
+                return cached
+        
+        product, row_version = db.get_product_by_id(product_id, with_version=True, fmt=fmt)
         if not product:
             return jsonify({'error': 'Product not found'}), 404
-        return jsonify(product)
+        return with_etag(jsonify(product), f'product-{product_id}-{row_version}')
     except Exception as e:
-        print(f'Error fetching product: {e}')
+        logger.error('Error fetching product: %s', e)
         return jsonify({'error': 'Failed to fetch product'}), 500
 
 @app.route('/api/products', methods=['POST'])
@@ -121,9 +302,87 @@ def create_product():
         )
         return jsonify(product), 201
     except Exception as e:
-        print(f'Error creating product: {e}')
+        logger.error('Error creating product: %s', e)
         return jsonify({'error': 'Failed to create product'}), 500
 
+@app.route('/api/products/import', methods=['POST'])
+def import_products():
+    """Bulk import from a CSV or NDJSON body (or multipart "file"), streamed through COPY"""
+    try:
+        upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+        fmt = request.args.get('format') or (
+            detect_format(upload.mimetype, upload.filename) if upload
+            else detect_format(request.mimetype)
+        )
+        if fmt not in FORMATS:
+            return jsonify({'error': f'Unsupported format, use one of: {", ".join(FORMATS)}'}), 400
+        try:
+            chunk_size = positive_int_arg('chunk_size', 10000)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        raw = upload.stream if upload else request.stream
+        stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        result = db.import_products(read_records(stream, fmt), chunk_size=chunk_size)
+        
+        logger.info('Imported products', extra={'inserted': result['inserted'], 'failed': result['failed']})
+        return jsonify(result)
+    except Exception as e:
+        logger.error('Error importing products: %s', e)
+        return jsonify({'error': 'Failed to import products'}), 500
+
+MAX_BATCH_OPERATIONS = int(os.getenv('MAX_BATCH_OPERATIONS', 10000))
+
+@app.route('/api/products/batch', methods=['POST'])
+def batch_products():
+    """Mixed create/update/delete operations applied in a single transaction"""
+    try:
+        data = request.get_json(silent=True)
+        operations = data.get('operations') if isinstance(data, dict) else data
+        if not isinstance(operations, list):
+            return jsonify({'error': 'Expected a list of operations'}), 400
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            return jsonify({'error': f'Too many operations (max {MAX_BATCH_OPERATIONS})'}), 413
+        atomic = not (isinstance(data, dict) and data.get('atomic') is False)
+        
+        result = db.batch_products(operations, atomic=atomic)
+        logger.info('Applied batch', extra={'operations': len(operations), 'committed': result['committed']})
+        return jsonify(result), 200 if result['committed'] else 400
+    except Exception as e:
+        logger.error('Error applying batch: %s', e)
+        return jsonify({'error': 'Failed to apply batch'}), 500
+
+@app.route('/api/products/export', methods=['GET'])
+def export_products():
+    """Stream all products as CSV or NDJSON in constant memory"""
+    try:
+        fmt = request.args.get('format', 'csv')
+        if fmt not in FORMATS:
+            return jsonify({'error': f'Unsupported format, use one of: {", ".join(FORMATS)}'}), 400
+        try:
+            batch_size = positive_int_arg('batch_size', 2000)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        batches = db.export_products(batch_size=batch_size)
+        # Run the query before sending headers so failures still get a 500
+        first = next(batches, None)
+        if first is not None:
+            batches = itertools.chain([first], batches)
+        
+        logger.info('Exporting products', extra={'format': fmt})
+        return Response(
+            encode_export(batches, fmt),
+            mimetype=CONTENT_TYPES[fmt].split(';')[0],
+            headers={
+                'Content-Type': CONTENT_TYPES[fmt],
+                'Content-Disposition': f'attachment; filename=products.{fmt}'
+            }
+        )
+    except Exception as e:
+        logger.error('Error exporting products: %s', e)
+        return jsonify({'error': 'Failed to export products'}), 500
+
 @app.route('/api/products/<int:product_id>', methods=['PUT'])
 def update_product(product_id):
     try:
@@ -141,7 +400,7 @@ def update_product(product_id):
             return jsonify({'error': 'Product not found'}), 404
         return jsonify(product)
     except Exception as e:
-        print(f'Error updating product: {e}')
+        logger.error('Error updating product: %s', e)
         return jsonify({'error': 'Failed to update product'}), 500
 
 @app.route('/api/products/<int:product_id>', methods=['DELETE'])
@@ -152,68 +411,140 @@ def delete_product(product_id):
             return jsonify({'error': 'Product not found'}), 404
         return jsonify({'message': 'Product deleted successfully'})
     except Exception as e:
-        print(f'Error deleting product: {e}')
+        logger.error('Error deleting product: %s', e)
         return jsonify({'error': 'Failed to delete product'}), 500
 
 @app.route('/api/charts/line', methods=['GET'])
 def get_line_chart_data():
     try:
-        data = db.get_line_chart_data()
-        print(f'API Line Chart: {data}')
-        return jsonify(data)
+        try:
+            date_from = request.args.get('from')
+            date_to = request.args.get('to')
+            snapshot = db.chart_snapshot(
+                'get_line_chart_data',
+                date.fromisoformat(date_from) if date_from else None,
+                date.fromisoformat(date_to) if date_to else None,
+                request.args.get('bucket')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        etag = snapshot_etag('chart-line', snapshot)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        logger.debug('Line chart', extra={'points': len(snapshot.value['labels'])})
+        return with_etag(jsonify(snapshot.payload()), etag)
     except Exception as e:
-        print(f'Error fetching line chart data: {e}')
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error fetching line chart data: %s', e)
         return jsonify({'error': 'Failed to fetch line chart data'}), 500
 
 @app.route('/api/charts/bar', methods=['GET'])
 def get_bar_chart_data():
     try:
-        data = db.get_bar_chart_data()
-        print(f'API Bar Chart: {data}')
-        return jsonify(data)
+        snapshot = db.chart_snapshot('get_bar_chart_data')
+        etag = snapshot_etag('chart-bar', snapshot)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        logger.debug('Bar chart', extra={'points': len(snapshot.value['labels'])})
+        return with_etag(jsonify(snapshot.payload()), etag)
     except Exception as e:
-        print(f'Error fetching bar chart data: {e}')
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error fetching bar chart data: %s', e)
         return jsonify({'error': 'Failed to fetch bar chart data'}), 500
 
 @app.route('/api/charts/pie', methods=['GET'])
 def get_pie_chart_data():
     try:
-        data = db.get_pie_chart_data()
-        print(f'API Pie Chart: {data}')
-        return jsonify(data)
+        snapshot = db.chart_snapshot('get_pie_chart_data')
+        etag = snapshot_etag('chart-pie', snapshot)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        logger.debug('Pie chart', extra={'points': len(snapshot.value['labels'])})
+        return with_etag(jsonify(snapshot.payload()), etag)
     except Exception as e:
-        print(f'Error fetching pie chart data: {e}')
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error fetching pie chart data: %s', e)
         return jsonify({'error': 'Failed to fetch pie chart data'}), 500
 
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard_data():
+    """All three chart datasets in one response (one request, one table scan)"""
+    try:
+        snapshot = db.chart_snapshot('get_dashboard_data')
+        etag = snapshot_etag('dashboard', snapshot)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        logger.debug('Dashboard: line/bar/pie returned')
+        return with_etag(jsonify(snapshot.payload()), etag)
+    except Exception as e:
+        logger.exception('Error fetching dashboard data: %s', e)
+        return jsonify({'error': 'Failed to fetch dashboard data'}), 500
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition (all gunicorn workers when METRICS_DIR is set)"""
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Chart cache hit/miss counters and chart snapshot refreshes"""
+    return jsonify(dict(db.query_cache.stats(), snapshots=db.snapshots.stats()))
+
+@app.route('/api/pool/stats', methods=['GET'])
+def get_pool_stats():
+    """Connection pool checkout / wait / exhaustion counters"""
+    return jsonify(db.get_pool_stats())
+
+def send_static(directory, path):
+    """Serve a static file from the precompressed cache, other files from disk"""
+    asset = static_assets.get(directory, path)
+    if asset is None:
+        return send_from_directory(directory, path)
+    cached = not_modified(asset.etag)
+    if cached:
+        return cached
+    encoding, body = asset.body(compression.choose_encoding(request.accept_encodings))
+    response = app.response_class(body, mimetype=asset.mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return with_etag(response, asset.etag)
+
 # Serve static files
 @app.route('/')
 def index():
-    return send_from_directory('.', 'index.html')
+    return send_static('.', 'index.html')
 
 @app.route('/components/<path:path>')
 def serve_components(path):
-    return send_from_directory('components', path)
+    return send_static('components', path)
 
 @app.route('/<path:path>')
 def serve_static(path):
     # Don't serve .env or other sensitive files
     if path.startswith('.') or path.startswith('__'):
         return "Not found", 404
-    return send_from_directory('.', path)
+    return send_static('.', path)
 
 if __name__ == '__main__':
+    # SERVER_MODE=async serves the same API from async_app.py (Quart + async pool)
+    # SERVER_MODE=production runs gunicorn workers (settings in gunicorn.conf.py)
+    server_mode = os.getenv('SERVER_MODE', 'sync').strip().lower()
+    if server_mode == 'async':
+        import async_app
+        async_app.main()
+        raise SystemExit(0)
+    if server_mode == 'production':
+        os.execvp('gunicorn', ['gunicorn', 'app:app'])
+    
+    # Development server: single process with the debug reloader.
     # Initialize database connection
     db.init()
     
     port = int(os.getenv('PORT', 3000))
-    print(f'Server is running on http://localhost:{port}')
-    print(f'Open http://localhost:{port}/index.html in your browser')
+    logger.info(f'Server is running on http://localhost:{port}')
+    logger.info(f'Open http://localhost:{port}/index.html in your browser')
     
     app.run(host='0.0.0.0', port=port, debug=True)
 
@@ -0,0 +1,456 @@
+"""
+ASGI variant of the API (Quart + psycopg 3 async pool).
+
+Serves the same product and chart endpoints as app.py, with the same JSON
+and ETags, but handlers await the database instead of holding a thread for
+the whole round trip. Bulk endpoints (import / export / batch) stay in the
+WSGI app.
+
+Run with:
+    SERVER_MODE=async python app.py
+    python async_app.py
+    hypercorn async_app:app --bind 0.0.0.0:3000
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import date
+from dotenv import load_dotenv
+from quart import Quart, g, jsonify, request, send_from_directory
+from quart.json.provider import DefaultJSONProvider
+from async_database import AsyncDatabase
+from queries import PRODUCT_FORMATS, parse_product_filters, parse_sort
+import fast_json
+import compression
+import log_config
+import metrics
+import replicas
+
+load_dotenv()
+log_config.setup_logging()
+logger = logging.getLogger('async_app')
+
+app = Quart(__name__, static_folder=None)
+fast_json.install(app, DefaultJSONProvider)
+
+# Static files compressed once and served from memory
+static_assets = compression.StaticAssets(app.root_path).load()
+
+db = AsyncDatabase()
+
+
+# Values read at scrape time by /metrics
+def pool_connections():
+    stats = db.get_pool_stats() if db.pool else {}
+    if not stats:
+        return {}
+    return {
+        ('in_use',): stats['pool_size'] - stats['pool_available'],
+        ('idle',): stats['pool_available'],
+        ('max',): stats['pool_max'],
+        ('waiting',): stats.get('requests_waiting', 0)
+    }
+
+
+metrics.register_callback('db_pool_connections', 'Pool connections by state', 'gauge', ('state',), pool_connections)
+metrics.register_callback(
+    'cache_requests_total', 'Query cache lookups', 'counter', ('cache', 'result'),
+    metrics.cache_counters({'chart': db.query_cache, 'search': db.search_cache})
+)
+metrics.register_callback(
+    'log_records_dropped_total', 'Log records dropped because the queue was full', 'counter', (),
+    lambda: {(): log_config.dropped_records()}
+)
+
+
+@app.before_serving
+async def startup():
+    await db.init()
+
+
+@app.after_serving
+async def shutdown():
+    await db.close()
+
+
+@app.after_request
+async def allow_cors(response):
+    # Same policy as flask_cors in app.py: any origin for /api/*
+    if request.path.startswith('/api/'):
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, If-None-Match'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+    return response
+
+
+@app.before_request
+async def start_timer():
+    g.started = time.perf_counter()
+
+
+@app.before_request
+async def route_reads():
+    # A client that wrote within DB_READ_YOUR_WRITES seconds reads from the
+    # primary, whichever worker serves it
+    replicas.pin_primary(replicas.PRIMARY_COOKIE in request.cookies)
+    # The ETag's data version and the rows must come from the same server
+    replicas.hold_replica()
+
+
+@app.after_request
+async def remember_write(response):
+    max_age = db.replica_set.cookie_max_age
+    if max_age and request.method in replicas.WRITE_METHODS and response.status_code < 400:
+        response.set_cookie(replicas.PRIMARY_COOKIE, '1', max_age=max_age, httponly=True, samesite='Lax')
+    return response
+
+
+@app.after_request
+async def log_request(response):
+    """Sampled access record (LOG_SAMPLE) and latency histogram, timed after compression"""
+    started = g.get('started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else None
+        duration = time.perf_counter() - started
+        metrics.observe_request(route, request.method, response.status_code, duration)
+        log_config.log_request(route, request.method, request.path, response.status_code, duration)
+    return response
+
+
+@app.after_request
+async def compress_response(response):
+    """gzip / brotli for JSON and text responses above COMPRESS_MIN_SIZE"""
+    encoding = compression.choose_encoding(request.accept_encodings)
+    if compression.wants_compression(response, encoding):
+        compression.apply_compression(response, await response.get_data(), encoding)
+    return response
+
+
+def not_modified(etag):
+    """Return a 304 response if the client already has `etag`, otherwise None"""
+    if etag and request.if_none_match.contains_weak(etag):
+        response = app.response_class('', status=304)
+        return with_etag(response, etag)
+    return None
+
+
+def with_etag(response, etag):
+    """Attach a weak ETag and ask clients to revalidate before reusing the body"""
+    if etag:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+async def data_etag(name):
+    """ETag for a response that depends only on the products table"""
+    version = await db.get_data_version()
+    return f'{name}-{version}' if version else None
+
+
+def snapshot_etag(name, snapshot):
+    """ETag of a chart snapshot: the data version it was computed at, not the current one"""
+    return f'{name}-{snapshot.version}' if snapshot.version else None
+
+
+@app.route('/api/products', methods=['GET'])
+async def get_products():
+    try:
+        etag = await data_etag('products')
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        limit = int(request.args.get('limit', 10))
+        # ?format=raw: numeric amount and ISO date instead of display strings
+        fmt = request.args.get('format') or None
+        if fmt is not None and fmt not in PRODUCT_FORMATS:
+            return jsonify({'error': f'Unsupported format, use one of: {", ".join(PRODUCT_FORMATS)}'}), 400
+        # Whitelisted filters (?category=Books,Food&date_from=...) and ?sort=-date
+        try:
+            filters = parse_product_filters(request.args)
+            sort = request.args.get('sort') or None
+            parse_sort(sort)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Cursor mode: ?after=<cursor> / ?before=<cursor> (empty after= means first page)
+        if 'after' in request.args or 'before' in request.args:
+            try:
+                page_query = db.get_products_by_cursor(
+                    limit,
+                    after=request.args.get('after') or None,
+                    before=request.args.get('before') or None,
+                    fmt=fmt,
+                    filters=filters,
+                    sort=sort
+                )
+                # Page and total run concurrently on two pooled connections
+                result, (total, total_exact) = await asyncio.gather(page_query, db.count_products(filters=filters))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+            return with_etag(jsonify({
+                'data': result['data'],
+                'pagination': {
+                    'limit': limit,
+                    'total': total,
+                    'totalExact': total_exact,
+                    'totalPages': (total + limit - 1) // limit,
+                    'nextCursor': result['next_cursor'],
+                    'prevCursor': result['prev_cursor']
+                }
+            }), etag)
+
+        page = int(request.args.get('page', 1))
+        offset = (page - 1) * limit
+
+        products, (total, total_exact) = await asyncio.gather(
+            db.get_products(limit, offset, fmt=fmt, filters=filters, sort=sort), db.count_products(filters=filters)
+        )
+
+        return with_etag(jsonify({
+            'data': products,
+            'pagination': {
+                'page': page,
+                'limit': limit,
+                'total': total,
+                'totalExact': total_exact,
+                'totalPages': (total + limit - 1) // limit
+            }
+        }), etag)
+    except Exception as e:
+        logger.exception('Error fetching products: %s', e)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/products/search', methods=['GET'])
+async def search_products():
+    """Typeahead search by name: ?q=lap&limit=10 (prefix matches first, then substring)"""
+    try:
+        fmt = request.args.get('format') or None
+        if fmt is not None and fmt not in PRODUCT_FORMATS:
+            return jsonify({'error': f'Unsupported format, use one of: {", ".join(PRODUCT_FORMATS)}'}), 400
+
+        q = request.args.get('q', '')
+        result = await db.search_products(q, request.args.get('limit', type=int), fmt=fmt)
+        # partial: the SEARCH_TIMEOUT_MS budget ran out before all matches were found
+        return jsonify({'query': q.strip(), 'data': result['data'], 'partial': result['partial']})
+    except Exception as e:
+        logger.error('Error searching products: %s', e)
+        return jsonify({'error': 'Failed to search products'}), 500
+
+
+@app.route('/api/products/<int:product_id>', methods=['GET'])
+async def get_product(product_id):
+    try:
+        fmt = request.args.get('format') or None
+        if fmt is not None and fmt not in PRODUCT_FORMATS:
+            return jsonify({'error': f'Unsupported format, use one of: {", ".join(PRODUCT_FORMATS)}'}), 400
+
+        # Revalidation only needs the row version, not the formatted row
+        if request.if_none_match:
+            row_version = await db.get_product_version(product_id)
+            if row_version is None:
+                return jsonify({'error': 'Product not found'}), 404
+            cached = not_modified(f'product-{product_id}-{row_version}')
+            if cached:
+                return cached
+
+        product, row_version = await db.get_product_by_id(product_id, with_version=True, fmt=fmt)
+        if not product:
+            return jsonify({'error': 'Product not found'}), 404
+        return with_etag(jsonify(product), f'product-{product_id}-{row_version}')
+    except Exception as e:
+        logger.error('Error fetching product: %s', e)
+        return jsonify({'error': 'Failed to fetch product'}), 500
+
+
+@app.route('/api/products', methods=['POST'])
+async def create_product():
+    try:
+        data = await request.get_json()
+        product = await db.create_product(
+            data.get('name'),
+            data.get('category'),
+            data.get('status'),
+            data.get('amount'),
+            data.get('date'),
+            data.get('rating')
+        )
+        return jsonify(product), 201
+    except Exception as e:
+        logger.error('Error creating product: %s', e)
+        return jsonify({'error': 'Failed to create product'}), 500
+
+
+@app.route('/api/products/<int:product_id>', methods=['PUT'])
+async def update_product(product_id):
+    try:
+        data = await request.get_json()
+        product = await db.update_product(
+            product_id,
+            data.get('name'),
+            data.get('category'),
+            data.get('status'),
+            data.get('amount'),
+            data.get('date'),
+            data.get('rating')
+        )
+        if not product:
+            return jsonify({'error': 'Product not found'}), 404
+        return jsonify(product)
+    except Exception as e:
+        logger.error('Error updating product: %s', e)
+        return jsonify({'error': 'Failed to update product'}), 500
+
+
+@app.route('/api/products/<int:product_id>', methods=['DELETE'])
+async def delete_product(product_id):
+    try:
+        success = await db.delete_product(product_id)
+        if not success:
+            return jsonify({'error': 'Product not found'}), 404
+        return jsonify({'message': 'Product deleted successfully'})
+    except Exception as e:
+        logger.error('Error deleting product: %s', e)
+        return jsonify({'error': 'Failed to delete product'}), 500
+
+
+@app.route('/api/charts/line', methods=['GET'])
+async def get_line_chart_data():
+    try:
+        try:
+            date_from = request.args.get('from')
+            date_to = request.args.get('to')
+            snapshot = await db.chart_snapshot(
+                'get_line_chart_data',
+                date.fromisoformat(date_from) if date_from else None,
+                date.fromisoformat(date_to) if date_to else None,
+                request.args.get('bucket')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        etag = snapshot_etag('chart-line', snapshot)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        return with_etag(jsonify(snapshot.payload()), etag)
+    except Exception as e:
+        logger.exception('Error fetching line chart data: %s', e)
+        return jsonify({'error': 'Failed to fetch line chart data'}), 500
+
+
+@app.route('/api/charts/bar', methods=['GET'])
+async def get_bar_chart_data():
+    try:
+        snapshot = await db.chart_snapshot('get_bar_chart_data')
+        etag = snapshot_etag('chart-bar', snapshot)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        return with_etag(jsonify(snapshot.payload()), etag)
+    except Exception as e:
+        logger.exception('Error fetching bar chart data: %s', e)
+        return jsonify({'error': 'Failed to fetch bar chart data'}), 500
+
+
+@app.route('/api/charts/pie', methods=['GET'])
+async def get_pie_chart_data():
+    try:
+        snapshot = await db.chart_snapshot('get_pie_chart_data')
+        etag = snapshot_etag('chart-pie', snapshot)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        return with_etag(jsonify(snapshot.payload()), etag)
+    except Exception as e:
+        logger.exception('Error fetching pie chart data: %s', e)
+        return jsonify({'error': 'Failed to fetch pie chart data'}), 500
+
+
+@app.route('/api/dashboard', methods=['GET'])
+async def get_dashboard_data():
+    """All three chart datasets in one response (one request, one table scan)"""
+    try:
+        snapshot = await db.chart_snapshot('get_dashboard_data')
+        etag = snapshot_etag('dashboard', snapshot)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        return with_etag(jsonify(snapshot.payload()), etag)
+    except Exception as e:
+        logger.exception('Error fetching dashboard data: %s', e)
+        return jsonify({'error': 'Failed to fetch dashboard data'}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+async def get_metrics():
+    """Prometheus text exposition (all gunicorn workers when METRICS_DIR is set)"""
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+async def get_cache_stats():
+    """Chart cache hit/miss counters and chart snapshot refreshes"""
+    return jsonify(dict(db.query_cache.stats(), snapshots=db.snapshots.stats()))
+
+
+@app.route('/api/pool/stats', methods=['GET'])
+async def get_pool_stats():
+    """Async pool counters (psycopg_pool)"""
+    return jsonify(db.get_pool_stats())
+
+
+async def send_static(directory, path):
+    """Serve a static file from the precompressed cache, other files from disk"""
+    asset = static_assets.get(directory, path)
+    if asset is None:
+        return await send_from_directory(directory, path)
+    cached = not_modified(asset.etag)
+    if cached:
+        return cached
+    encoding, body = asset.body(compression.choose_encoding(request.accept_encodings))
+    response = app.response_class(body, mimetype=asset.mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return with_etag(response, asset.etag)
+
+
+# Serve static files
+@app.route('/')
+async def index():
+    return await send_static('.', 'index.html')
+
+
+@app.route('/components/<path:path>')
+async def serve_components(path):
+    return await send_static('components', path)
+
+
+@app.route('/<path:path>')
+async def serve_static(path):
+    # Don't serve .env or other sensitive files
+    if path.startswith('.') or path.startswith('__'):
+        return "Not found", 404
+    return await send_static('.', path)
+
+
+def main():
+    """Serve the ASGI app with hypercorn"""
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    port = int(os.getenv('PORT', 3000))
+    config = Config()
+    config.bind = [f'0.0.0.0:{port}']
+    logger.info(f'Server is running on http://localhost:{port} (async mode)')
+    logger.info(f'Open http://localhost:{port}/index.html in your browser')
+    asyncio.run(serve(app, config))
+
+
+if __name__ == '__main__':
+    main()
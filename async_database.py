@@ -0,0 +1,505 @@
+"""
+Async data layer for the ASGI server (async_app.py).
+
+Same queries and result shapes as database.Database, but every call awaits
+a psycopg 3 AsyncConnectionPool instead of blocking a thread, so a single
+process can keep thousands of requests in flight while they wait on
+PostgreSQL. Table setup, seeding and the rollup triggers are shared with
+the sync layer: init() runs Database.init() once before opening the pool.
+"""
+
+import asyncio
+import contextlib
+import functools
+import logging
+import os
+import time
+import psycopg
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from database import Database
+import metrics
+from replicas import Replica, ReplicaSet, holding_replica, replica_dsns, replica_read
+from snapshots import Snapshot
+from queries import (
+    decode_cursor, keyset_query, keyset_page,
+    product_columns, product_dicts, PRODUCT_KEYS, product_by_id_query,
+    page_query, count_query, estimate_query, plan_rows,
+    COUNT_SQL, COUNTER_SQL, ESTIMATE_SQL, DATA_VERSION_SQL, data_version,
+    LINE_CHART_SQL, line_chart_query, line_chart_result,
+    BAR_CHART_SQL, PIE_CHART_SQL, count_chart_result,
+    DASHBOARD_SQL, dashboard_result,
+    search_prefix_query, search_substring_query, search_result
+)
+
+logger = logging.getLogger(__name__)
+
+
+def async_cached_query(method):
+    """Memoize a read-only AsyncDatabase coroutine in AsyncDatabase.query_cache"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        cache = self.query_cache
+        if not cache.enabled:
+            return await method(self, *args, **kwargs)
+
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        found, value = cache.get(key)
+        if found:
+            return value
+
+        # Read the version before querying so a concurrent write wins
+        version = cache.version
+        value = await method(self, *args, **kwargs)
+        cache.set(key, value, version)
+        return value
+    return wrapper
+
+
+class AsyncDatabase:
+    def __init__(self):
+        self.pool = None
+        # Sync layer used once for table setup; count strategy and chart
+        # cache come from the same env settings
+        self.schema = Database()
+        self.count_strategy = self.schema.count_strategy
+        self.count_exact_threshold = self.schema.count_exact_threshold
+        self.query_cache = self.schema.query_cache
+        self.search_timeout_ms = self.schema.search_timeout_ms
+        self.search_max_results = self.schema.search_max_results
+        self.search_cache = self.schema.search_cache
+        # Chart snapshots (see snapshots.py), refreshed by a task on the
+        # event loop that init() starts
+        self.snapshots = self.schema.snapshots
+        self._snapshot_wake = asyncio.Event()
+        self._snapshot_inflight = {}  # key -> Future of the computation running for it
+        self._refresher = None
+        # Read replicas (DB_REPLICA_DSNS, see replicas.py); init() opens their pools
+        self.replica_set = ReplicaSet()
+        self.replica_errors = (psycopg.OperationalError, psycopg.InterfaceError)
+
+    async def init(self):
+        """Create tables (through the sync layer) and open the async pool"""
+        await asyncio.to_thread(self.schema.init)
+        dsn = self.schema.dsn
+        self.schema.close()
+
+        # DB_POOL_MIN / DB_POOL_MAX / DB_POOL_TIMEOUT / DB_POOL_MAX_LIFETIME
+        # mean the same as for the sync pool; connections are cheap to keep
+        # busy here, so the pool size is the cap on concurrent queries.
+        # psycopg 3 prepares a query by itself after prepare_threshold (5)
+        # runs on a connection; DB_PREPARED_STATEMENTS=0 turns that off too
+        connect_kwargs = {} if self.schema.prepared_statements else {'prepare_threshold': None}
+        pool_max = int(os.getenv('DB_POOL_MAX', 20))
+        self.pool = AsyncConnectionPool(
+            dsn,
+            kwargs=connect_kwargs,
+            min_size=int(os.getenv('DB_POOL_MIN', 1)),
+            max_size=pool_max,
+            timeout=float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+            open=False
+        )
+        await self.pool.open(wait=True)
+        logger.info('Connected to PostgreSQL database (async pool)')
+
+        # Replica pools start empty, so a replica that is down does not
+        # block startup
+        replica_set = ReplicaSet()
+        for replica_dsn in replica_dsns(dsn):
+            replica_pool = AsyncConnectionPool(
+                replica_dsn,
+                kwargs=dict(connect_kwargs, connect_timeout=replica_set.connect_timeout),
+                min_size=0,
+                max_size=int(os.getenv('DB_REPLICA_POOL_MAX', pool_max)),
+                max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+                open=False
+            )
+            await replica_pool.open()
+            replica_set.replicas.append(Replica(replica_dsn, replica_pool))
+        self.replica_set = replica_set
+        if replica_set:
+            logger.info('Reading from replicas: %s', ', '.join(r.name for r in replica_set.replicas))
+
+        if self.snapshots.enabled:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    def get_pool_stats(self):
+        """psycopg_pool counters (requests_waiting, pool_size, ...), plus per-replica read counters"""
+        stats = self.pool.get_stats()
+        if self.replica_set:
+            stats['replicas'] = self.replica_set.stats()
+        return stats
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        """Pooled connection; the checkout time goes to db_pool_wait_seconds
+
+        Inside a replica_read method the connection comes from a replica
+        when one may serve the read (ReplicaSet.candidates).
+        """
+        started = time.perf_counter()
+        for replica in self.replica_set.candidates():
+            try:
+                # A replica that is down makes the pool retry in the
+                # background; don't wait for it longer than a connect
+                conn = await replica.connection_pool.getconn(timeout=self.replica_set.connect_timeout)
+            except (psycopg.OperationalError, PoolTimeout) as e:
+                self.replica_set.failed(replica, e)
+                continue
+            metrics.POOL_WAIT.observe(time.perf_counter() - started)
+            self.replica_set.served(replica)
+            try:
+                # Commits or rolls back like AsyncConnectionPool.connection()
+                async with conn:
+                    yield conn
+            finally:
+                await replica.connection_pool.putconn(conn)
+            return
+
+        async with self.pool.connection() as conn:
+            metrics.POOL_WAIT.observe(time.perf_counter() - started)
+            self.replica_set.served(None)
+            yield conn
+
+    def _after_write(self):
+        """Invalidate cached reads; this process reads from the primary for a while"""
+        self.replica_set.wrote()
+        self.query_cache.bump_version()
+        self._snapshot_wake.set()
+
+    async def _fetch(self, sql, params=None, one=False):
+        """Run one query on a pooled connection and return its rows (tuples)"""
+        async with self.connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(sql, params)
+                if one:
+                    return await cursor.fetchone()
+                return await cursor.fetchall()
+
+    @metrics.timed
+    @replica_read
+    async def get_data_version(self):
+        """Same token as Database.get_data_version (shared through table_versions)"""
+        try:
+            return data_version(await self._fetch(DATA_VERSION_SQL, one=True))
+        except Exception as e:
+            logger.error('Error fetching data version: %s', e)
+            raise e
+
+    @metrics.timed
+    @replica_read
+    async def get_products(self, limit, offset, fmt=None, filters=None, sort=None):
+        """Get products with pagination (see Database.get_products)"""
+        try:
+            sql, params = page_query(limit, offset, fmt, filters, sort)
+            return product_dicts(await self._fetch(sql, params))
+        except Exception as e:
+            logger.error('Error fetching products: %s', e)
+            raise e
+
+    @metrics.timed
+    @replica_read
+    async def get_products_by_cursor(self, limit, after=None, before=None, fmt=None, filters=None, sort=None):
+        """Get products with keyset pagination (see Database.get_products_by_cursor)"""
+        try:
+            after_key = decode_cursor(after, sort) if after else None
+            before_key = decode_cursor(before, sort) if before else None
+
+            sql, params = keyset_query(limit, after_key, before_key, fmt, filters, sort)
+            rows = await self._fetch(sql, params)
+            return keyset_page(rows, limit, after_key, before_key, sort)
+        except Exception as e:
+            logger.error('Error fetching products: %s', e)
+            raise e
+
+    @metrics.timed
+    @replica_read
+    async def count_products(self, strategy=None, filters=None):
+        """Get (total, exact) using the configured count strategy (see Database.count_products)"""
+        strategy = strategy or self.count_strategy
+        try:
+            async with self.connection() as conn:
+                async with conn.cursor() as cursor:
+                    if filters:
+                        if strategy != 'exact':
+                            await cursor.execute(*estimate_query(filters))
+                            estimate = plan_rows((await cursor.fetchone())[0])
+                            if estimate >= self.count_exact_threshold:
+                                return estimate, False
+                        await cursor.execute(*count_query(filters))
+                        return (await cursor.fetchone())[0], True
+
+                    if strategy == 'exact':
+                        await cursor.execute(COUNT_SQL)
+                        return (await cursor.fetchone())[0], True
+
+                    if strategy == 'counter':
+                        await cursor.execute(COUNTER_SQL)
+                        row = await cursor.fetchone()
+                        if row is not None:
+                            return int(row[0]), True
+                        # Counter not installed, fall through to the estimate
+
+                    await cursor.execute(ESTIMATE_SQL)
+                    estimate = (await cursor.fetchone())[0]
+                    if estimate < self.count_exact_threshold:
+                        await cursor.execute(COUNT_SQL)
+                        return (await cursor.fetchone())[0], True
+                    return int(estimate), False
+        except Exception as e:
+            logger.error('Error counting products: %s', e)
+            raise e
+
+    @metrics.timed
+    @replica_read
+    async def get_product_by_id(self, product_id, with_version=False, fmt=None):
+        """Get product by ID, optionally with its row version (xmin)"""
+        try:
+            row = await self._fetch(*product_by_id_query(product_id, fmt), one=True)
+            if not row:
+                return (None, None) if with_version else None
+            product = dict(zip(PRODUCT_KEYS, row))
+            if with_version:
+                return product, row[-1]
+            return product
+        except Exception as e:
+            logger.error('Error fetching product: %s', e)
+            raise e
+
+    @metrics.timed
+    @replica_read
+    async def get_product_version(self, product_id):
+        """Get only the row version (xmin) of a product, None if it doesn't exist"""
+        try:
+            row = await self._fetch(
+                'SELECT xmin::text FROM products WHERE id = %s', (product_id,), one=True
+            )
+            return row[0] if row else None
+        except Exception as e:
+            logger.error('Error fetching product: %s', e)
+            raise e
+
+    @metrics.timed
+    @replica_read
+    async def search_products(self, q, limit=None, fmt=None):
+        """Products whose name starts with or contains `q` (see Database.search_products)"""
+        q = (q or '').strip()
+        limit = max(1, min(limit or self.search_max_results, self.search_max_results))
+        if not q:
+            return {'data': [], 'partial': False}
+
+        cache = self.search_cache
+        key = (q.lower(), limit, fmt, self.query_cache.version)
+        if cache.enabled:
+            found, value = cache.get(key)
+            if found:
+                return value
+        version = cache.version
+
+        try:
+            async with self.connection() as conn:
+                async with conn.cursor() as cursor:
+                    started = time.monotonic()
+                    budget = self.search_timeout_ms
+                    prefix_rows, substring_rows, partial = [], [], False
+                    try:
+                        if budget > 0:
+                            await cursor.execute("SELECT set_config('statement_timeout', %s, true)", (str(budget),))
+                        await cursor.execute(*search_prefix_query(q, limit, fmt))
+                        prefix_rows = await cursor.fetchall()
+                        substring = None
+                        if len(prefix_rows) < limit:
+                            substring = search_substring_query(q, limit - len(prefix_rows), fmt)
+                        if substring and budget > 0:
+                            remaining = budget - int((time.monotonic() - started) * 1000)
+                            if remaining > 0:
+                                await cursor.execute(
+                                    "SELECT set_config('statement_timeout', %s, true)", (str(remaining),)
+                                )
+                            else:
+                                substring, partial = None, True
+                        if substring:
+                            await cursor.execute(*substring)
+                            substring_rows = await cursor.fetchall()
+                    except psycopg.errors.QueryCanceled:
+                        partial = True
+                await conn.rollback()
+
+            result = {'data': search_result(prefix_rows, substring_rows, limit), 'partial': partial}
+            if cache.enabled and not partial:
+                cache.set(key, result, version)
+            return result
+        except Exception as e:
+            logger.error('Error searching products: %s', e)
+            raise e
+
+    @metrics.timed
+    async def create_product(self, name, category, status, amount, date, rating):
+        """Create new product"""
+        try:
+            # The pool commits when the connection block exits cleanly
+            row = await self._fetch(
+                'INSERT INTO products (name, category, status, amount, date, rating) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id',
+                (name, category, status, float(amount), date, rating),
+                one=True
+            )
+            self._after_write()
+            return {
+                'id': row[0],
+                'name': name,
+                'category': category,
+                'status': status,
+                'amount': f"${float(amount):.2f}",
+                'date': date,
+                'rating': rating
+            }
+        except Exception as e:
+            logger.error('Error creating product: %s', e)
+            raise e
+
+    @metrics.timed
+    async def update_product(self, product_id, name, category, status, amount, date, rating):
+        """Update product"""
+        try:
+            row = await self._fetch(
+                'UPDATE products SET name = %s, category = %s, status = %s, amount = %s, date = %s, rating = %s '
+                f'WHERE id = %s RETURNING {product_columns()}',
+                (name, category, status, float(amount), date, rating, product_id),
+                one=True
+            )
+            if not row:
+                return None
+            self._after_write()
+            return dict(zip(PRODUCT_KEYS, row))
+        except Exception as e:
+            logger.error('Error updating product: %s', e)
+            raise e
+
+    @metrics.timed
+    async def delete_product(self, product_id):
+        """Delete product"""
+        try:
+            row = await self._fetch(
+                'DELETE FROM products WHERE id = %s RETURNING id', (product_id,), one=True
+            )
+            if row is None:
+                return False
+            self._after_write()
+            return True
+        except Exception as e:
+            logger.error('Error deleting product: %s', e)
+            raise e
+
+    @async_cached_query
+    @metrics.timed
+    @replica_read
+    async def get_line_chart_data(self, date_from=None, date_to=None, bucket=None):
+        """Get line chart data (see Database.get_line_chart_data)"""
+        try:
+            params, label_format = line_chart_query(date_from, date_to, bucket)
+            rows = await self._fetch(LINE_CHART_SQL, params)
+            return line_chart_result(rows, label_format)
+        except Exception as e:
+            logger.error('Error fetching line chart data: %s', e)
+            raise e
+
+    @async_cached_query
+    @metrics.timed
+    @replica_read
+    async def get_bar_chart_data(self):
+        """Get bar chart data (inventory by category)"""
+        try:
+            return count_chart_result(await self._fetch(BAR_CHART_SQL))
+        except Exception as e:
+            logger.error('Error fetching bar chart data: %s', e)
+            raise e
+
+    @async_cached_query
+    @metrics.timed
+    @replica_read
+    async def get_pie_chart_data(self):
+        """Get pie chart data (status distribution)"""
+        try:
+            return count_chart_result(await self._fetch(PIE_CHART_SQL))
+        except Exception as e:
+            logger.error('Error fetching pie chart data: %s', e)
+            raise e
+
+    @async_cached_query
+    @metrics.timed
+    @replica_read
+    async def get_dashboard_data(self):
+        """Get line, bar and pie chart data with a single scan of products"""
+        try:
+            return dashboard_result(await self._fetch(DASHBOARD_SQL))
+        except Exception as e:
+            logger.error('Error fetching dashboard data: %s', e)
+            raise e
+
+    async def chart_snapshot(self, name, *args):
+        """Latest Snapshot of chart method `name`(*args) (see Database.chart_snapshot)"""
+        if not self.snapshots.enabled:
+            version = await self.get_data_version()
+            return Snapshot(await getattr(self, name)(*args), version)
+        snapshot = self.snapshots.get((name, args))
+        if snapshot is None:
+            snapshot = await self._compute_snapshot((name, args))
+        return snapshot
+
+    async def _compute_snapshot(self, key, refresh=False):
+        """Compute and store the snapshot for `key`; callers arriving meanwhile share the result"""
+        task = self._snapshot_inflight.get(key)
+        if task is None:
+            task = self._snapshot_inflight[key] = asyncio.create_task(self._take_snapshot(key, refresh))
+            task.add_done_callback(lambda _: self._snapshot_inflight.pop(key, None))
+        # A caller that goes away (client disconnect) must not cancel the
+        # computation the others are waiting for
+        return await asyncio.shield(task)
+
+    async def _take_snapshot(self, key, refresh):
+        # Both reads on one server, version first: a write landing during
+        # the query makes the snapshot look older than it is, never newer
+        name, args = key
+        with holding_replica():
+            version = await self.get_data_version()
+            value = await getattr(self, name)(*args)
+        snapshot = Snapshot(value, version)
+        self.snapshots.put(key, snapshot, refresh)
+        return snapshot
+
+    async def refresh_snapshots(self):
+        """Recompute the snapshots that are out of date, one at a time; returns how many"""
+        version = await self.get_data_version()
+        refreshed = 0
+        for key in self.snapshots.due(version):
+            try:
+                await self._compute_snapshot(key, refresh=True)
+                refreshed += 1
+            except Exception as e:
+                self.snapshots.failures += 1
+                logger.warning('Chart snapshot %s%s not refreshed: %s', key[0], key[1], e)
+        return refreshed
+
+    async def _refresh_loop(self):
+        while True:
+            # Woken early by writes in this process (_after_write)
+            try:
+                await asyncio.wait_for(self._snapshot_wake.wait(), self.snapshots.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._snapshot_wake.clear()
+            try:
+                await self.refresh_snapshots()
+            except Exception as e:
+                logger.warning('Chart snapshot refresh failed: %s', e)
+
+    async def close(self):
+        """Close all connections in the pool"""
+        if self.pool:
+            if self._refresher is not None:
+                self._refresher.cancel()
+                self._refresher = None
+            await self.pool.close()
+            for replica in self.replica_set.replicas:
+                await replica.connection_pool.close()
+            logger.info('Database connection pool closed')
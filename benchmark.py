@@ -0,0 +1,517 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест и бенчмарк API на локальном PostgreSQL
+
+Заполняет таблицу products до нужного числа строк (10k, 1m, 10m), при
+необходимости сам запускает сервер и по очереди нагружает сценарии
+(/api/products — первые и дальние страницы, /api/products/<id>, графики,
+запись) с заданным числом параллельных клиентов. Результат — JSON с
+пропускной способностью и задержками p50/p95/p99 по каждому сценарию,
+который можно сравнить с прошлым запуском (--compare).
+
+Примеры:
+    python benchmark.py --rows 10k --server production
+    python benchmark.py --rows 1m --reset --server async --concurrency 32 --output after.json --compare before.json
+    python benchmark.py --url http://localhost:3000 --scenarios product_by_id,chart_bar
+
+Внимание: --rows добавляет строки, а --reset очищает таблицу products.
+Используйте отдельную базу (DB_NAME в .env).
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+from database import Database
+from generate_products import load as load_generated
+from queries import encode_cursor, keyset_query, page_query, prepared_call, product_by_id_query
+
+SCENARIOS = (
+    'products_shallow', 'products_deep', 'products_deep_cursor', 'product_by_id',
+    'chart_line', 'chart_bar', 'chart_pie', 'writes'
+)
+
+PAGE_SIZE = 20
+
+# Settings that change the results; recorded with every run
+RECORDED_ENV = (
+    'WEB_WORKERS', 'WEB_THREADS', 'DB_POOL_MAX', 'DB_POOL_MODE', 'PRODUCTS_COUNT_STRATEGY',
+    'CHART_CACHE_TTL', 'SEARCH_CACHE_TTL', 'JSON_ENCODER', 'COMPRESSION', 'LOG_LEVEL', 'LOG_SAMPLE'
+)
+
+# Existing ids sampled for the product_by_id scenario
+ID_SAMPLE = 10000
+
+# Database-level paths timed as plain text and as prepared statements (--statements);
+# deep OFFSET pages are left out, their time is all execution
+STATEMENT_PATHS = ('product_by_id', 'products_shallow', 'products_deep_cursor')
+# EXPLAIN ANALYZE runs per path and mode for the server-side planning time
+PLAN_SAMPLES = 20
+STATEMENT_ROUNDS = 10
+
+def parse_count(value):
+    """'10k' / '1m' / '10m' / '2500' -> int"""
+    text = value.strip().lower().replace('_', '')
+    multiplier = 1
+    if text.endswith('k'):
+        multiplier, text = 1000, text[:-1]
+    elif text.endswith('m'):
+        multiplier, text = 1000000, text[:-1]
+    try:
+        return int(float(text) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid row count: {value}')
+
+
+def prepare_data(db, rows, reset, seed, workers=1):
+    """Bring products to `rows` rows; returns (row count, min id, max id, sample of existing ids)"""
+    if reset:
+        print('Очистка таблицы products...')
+    if rows:
+        # Same generator as generate_products.py: identical data between runs
+        started = time.perf_counter()
+        inserted = load_generated(db, rows, seed=seed, workers=workers, reset=reset)
+        if inserted:
+            print(f'Добавлено {inserted} строк за {time.perf_counter() - started:.1f} с')
+    elif reset:
+        load_generated(db, 0, reset=True)
+
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM products')
+        current = cursor.fetchone()[0]
+        if rows and current > rows:
+            print(f'В таблице уже {current} строк (больше --rows); --reset, чтобы пересоздать')
+
+        cursor.execute('SELECT COUNT(*), MIN(id), MAX(id) FROM products')
+        count, min_id, max_id = cursor.fetchone()
+        # Ids have gaps (deleted rows); /api/products/<id> picks from real ones
+        percent = min(100.0, ID_SAMPLE * 100.0 / max(count, 1))
+        cursor.execute(
+            'SELECT id FROM products TABLESAMPLE BERNOULLI (%s) REPEATABLE (%s) ORDER BY id',
+            (percent, seed)
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        db.query_cache.bump_version()
+        return count, min_id or 0, max_id or 0, ids
+    finally:
+        db.return_connection(conn)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, port, log_path):
+    """Start the app in `mode` (sync / async / production) and wait until it answers"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    if mode == 'production':
+        command = ['gunicorn', 'app:app']
+    elif mode == 'async':
+        command = [sys.executable, 'async_app.py']
+    else:
+        # Threaded werkzeug server without the debug reloader
+        command = [
+            sys.executable, '-c',
+            'import os; from app import app, db; db.init(); '
+            'app.run(host="127.0.0.1", port=int(os.environ["PORT"]), threaded=True)'
+        ]
+    env = dict(os.environ, PORT=str(port))
+    log = open(log_path, 'ab') if log_path else subprocess.DEVNULL
+    process = subprocess.Popen(command, cwd=here, env=env, stdout=log, stderr=subprocess.STDOUT,
+                               start_new_session=True)
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with code {process.returncode} (see --server-log)')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/dashboard')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process
+        except OSError:
+            pass
+        time.sleep(0.5)
+    stop_server(process)
+    raise RuntimeError('server did not start within 60 s')
+
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=15)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+class Client:
+    """One keep-alive HTTP connection that records (latency, status) of each request"""
+
+    def __init__(self, host, port, accept_encoding):
+        self.host = host
+        self.port = port
+        self.headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+        self.conn = None
+        self.samples = []
+        self.statuses = {}
+        self.errors = 0
+
+    def request(self, method, path, body=None):
+        """Send one request; returns the decoded JSON body for small JSON responses"""
+        headers = dict(self.headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        started = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.errors += 1
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = None
+            return None
+        self.samples.append(time.perf_counter() - started)
+        self.statuses[response.status] = self.statuses.get(response.status, 0) + 1
+        if response.status >= 400:
+            self.errors += 1
+            return None
+        if method != 'GET' and not response.getheader('Content-Encoding'):
+            return json.loads(data)
+        return None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+def run_scenario(name, client, rng, ctx):
+    """One iteration of scenario `name` (writes sends three requests)"""
+    total, min_id, max_id = ctx['rows'], ctx['min_id'], ctx['max_id']
+    if name == 'products_shallow':
+        client.request('GET', f'/api/products?page={rng.randint(1, 10)}&limit={PAGE_SIZE}')
+    elif name == 'products_deep':
+        last_page = max(1, total // PAGE_SIZE)
+        page = max(1, last_page - rng.randint(0, 10))
+        client.request('GET', f'/api/products?page={page}&limit={PAGE_SIZE}')
+    elif name == 'products_deep_cursor':
+        after = encode_cursor(max(min_id, max_id - rng.randint(PAGE_SIZE, 10 * PAGE_SIZE)))
+        client.request('GET', f'/api/products?after={after}&limit={PAGE_SIZE}')
+    elif name == 'product_by_id':
+        client.request('GET', f"/api/products/{rng.choice(ctx['ids'])}")
+    elif name == 'chart_line':
+        client.request('GET', '/api/charts/line')
+    elif name == 'chart_bar':
+        client.request('GET', '/api/charts/bar')
+    elif name == 'chart_pie':
+        client.request('GET', '/api/charts/pie')
+    elif name == 'writes':
+        # Create, update and delete the same row, so the table size stays put
+        data = {
+            'name': f'Benchmark {rng.randint(1, 10 ** 9)}',
+            'category': rng.choice(['Electronics', 'Clothing', 'Food', 'Furniture', 'Books']),
+            'status': rng.choice(['Completed', 'Pending', 'Cancelled']),
+            'amount': round(rng.uniform(10, 1000), 2),
+            'date': datetime.now().date().isoformat(),
+            'rating': rng.randint(1, 5)
+        }
+        created = client.request('POST', '/api/products', data)
+        if created and created.get('id'):
+            client.request('PUT', f"/api/products/{created['id']}", dict(data, status='Completed'))
+            client.request('DELETE', f"/api/products/{created['id']}")
+
+
+def statement_query(name, rng, ctx):
+    """(sql, params) the Database method behind scenario `name` runs"""
+    min_id, max_id = ctx['min_id'], ctx['max_id']
+    if name == 'product_by_id':
+        return product_by_id_query(rng.choice(ctx['ids']))
+    if name == 'products_shallow':
+        return page_query(PAGE_SIZE, (rng.randint(1, 10) - 1) * PAGE_SIZE)
+    return keyset_query(PAGE_SIZE, after=(max(min_id, max_id - rng.randint(PAGE_SIZE, 10 * PAGE_SIZE)),))
+
+
+def measure_statements(db, ctx, iterations, seed):
+    """Time the lookup / listing queries as plain text and through EXECUTE.
+
+    Both modes run the same `iterations` queries on one pooled connection
+    (prepared by Database.get_connection). Returns, per path and mode, the
+    mean round trip in microseconds and the median planning time the
+    server reports in EXPLAIN ANALYZE.
+    """
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        results = {}
+        for name in STATEMENT_PATHS:
+            if name == 'product_by_id' and not ctx['ids']:
+                continue
+            rng = random.Random(seed)
+            text_calls = [statement_query(name, rng, ctx) for _ in range(iterations)]
+            modes = {
+                'text': text_calls,
+                'prepared': [prepared_call(sql, params)[1:] for sql, params in text_calls]
+            }
+            planning = {mode: [] for mode in modes}
+            for mode, calls in modes.items():
+                for sql, params in calls[:PLAN_SAMPLES]:
+                    cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}', params)
+                    planning[mode].append(cursor.fetchone()[0][0]['Planning Time'])
+            # Alternate the modes in rounds so drift affects both alike
+            elapsed = dict.fromkeys(modes, 0.0)
+            step = max(1, iterations // STATEMENT_ROUNDS)
+            for first in range(0, iterations, step):
+                for mode, calls in modes.items():
+                    started = time.perf_counter()
+                    for sql, params in calls[first:first + step]:
+                        cursor.execute(sql, params)
+                        cursor.fetchall()
+                    elapsed[mode] += time.perf_counter() - started
+            entry = {}
+            for mode in modes:
+                entry[mode] = {
+                    'mean_us': round(elapsed[mode] / iterations * 1e6, 1),
+                    'planning_ms': round(percentile(sorted(planning[mode]), 50), 4)
+                }
+            entry['saved_us'] = round(entry['text']['mean_us'] - entry['prepared']['mean_us'], 1)
+            results[name] = entry
+        cursor.close()
+        return results
+    finally:
+        conn.rollback()
+        db.return_connection(conn)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def load(name, ctx, args):
+    """Drive one scenario with args.concurrency clients; returns its result dict"""
+    host, port = ctx['host'], ctx['port']
+    clients = [Client(host, port, args.accept_encoding) for _ in range(args.concurrency)]
+
+    def worker(index, client, deadline, count):
+        rng = random.Random(args.seed * 1000 + index)
+        done = 0
+        while (deadline is None or time.perf_counter() < deadline) and (count is None or done < count):
+            run_scenario(name, client, rng, ctx)
+            done += 1
+
+    def phase(seconds=None, count=None):
+        deadline = time.perf_counter() + seconds if seconds is not None else None
+        threads = [
+            threading.Thread(target=worker, args=(i, c, deadline, count), daemon=True)
+            for i, c in enumerate(clients)
+        ]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - started
+
+    if args.warmup > 0:
+        phase(args.warmup)
+        for c in clients:
+            c.samples, c.statuses, c.errors = [], {}, 0
+
+    if args.requests:
+        elapsed = phase(count=-(-args.requests // args.concurrency))
+    else:
+        elapsed = phase(args.duration)
+    for c in clients:
+        c.close()
+
+    samples = sorted(s for c in clients for s in c.samples)
+    statuses = {}
+    for c in clients:
+        for status, n in c.statuses.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + n
+
+    def ms(seconds):
+        return round(seconds * 1000, 3) if seconds is not None else None
+
+    return {
+        'requests': len(samples),
+        'errors': sum(c.errors for c in clients),
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed > 0 else 0,
+        'latency_ms': {
+            'p50': ms(percentile(samples, 50)),
+            'p95': ms(percentile(samples, 95)),
+            'p99': ms(percentile(samples, 99)),
+            'max': ms(samples[-1] if samples else None),
+            'mean': ms(sum(samples) / len(samples) if samples else None)
+        },
+        'status': statuses
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_comparison(result, baseline):
+    """Throughput and p95 change per scenario against an earlier run"""
+    out = sys.stderr
+    print(f"\nСравнение с {baseline['meta'].get('git_commit')} ({baseline['meta'].get('started_at')}):", file=out)
+    print(f"  {'сценарий':<22}{'rps было':>10}{'rps стало':>11}{'Δ':>8}{'p95 было':>11}{'p95 стало':>11}{'Δ':>8}", file=out)
+    for name, current in result['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        def change(new, old):
+            return f'{(new - old) / old * 100:+.0f}%' if old else '—'
+        rps_old, rps_new = before['throughput_rps'], current['throughput_rps']
+        p95_old, p95_new = before['latency_ms']['p95'] or 0, current['latency_ms']['p95'] or 0
+        print(f'  {name:<22}{rps_old:>10}{rps_new:>11}{change(rps_new, rps_old):>8}'
+              f'{p95_old:>11}{p95_new:>11}{change(p95_new, p95_old):>8}', file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the API and report throughput and p50/p95/p99 latency as JSON')
+    parser.add_argument('--rows', type=parse_count, help='seed products up to this many rows (10k, 1m, 10m, ...)')
+    parser.add_argument('--reset', action='store_true', help='TRUNCATE products before seeding')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for data and request mix')
+    parser.add_argument('--load-workers', type=int, default=1, help='processes generating --rows (see generate_products.py)')
+    parser.add_argument('--server', choices=('sync', 'async', 'production'), default='production',
+                        help='server to start for the run (ignored with --url)')
+    parser.add_argument('--url', help='benchmark an already running server instead of starting one')
+    parser.add_argument('--server-log', help='write the started server output to this file')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f'comma-separated subset of: {", ".join(SCENARIOS)}')
+    parser.add_argument('--concurrency', type=int, default=8, help='parallel clients')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per scenario')
+    parser.add_argument('--requests', type=int, help='fixed number of iterations per scenario instead of --duration')
+    parser.add_argument('--warmup', type=float, default=2, help='unmeasured seconds before each scenario')
+    parser.add_argument('--accept-encoding', default='gzip, br', help='Accept-Encoding sent by the clients ("" for none)')
+    parser.add_argument('--statements', type=int, default=0,
+                        help='also time N lookup / listing queries as plain text vs prepared statements')
+    parser.add_argument('--output', help='write the JSON result to this file (default: stdout)')
+    parser.add_argument('--compare', help='earlier JSON result to compare against')
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(unknown)}')
+
+    # Load environment variables
+    load_dotenv()
+    # Database messages go to the console as plain lines
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stderr)
+
+    db = Database()
+    db.init()
+    try:
+        rows, min_id, max_id, ids = prepare_data(db, args.rows, args.reset, args.seed, args.load_workers)
+        ctx = {'rows': rows, 'min_id': min_id, 'max_id': max_id, 'ids': ids}
+        statements = None
+        if args.statements > 0:
+            if db.prepared_statements:
+                print('Подготовленные запросы...', file=sys.stderr)
+                statements = measure_statements(db, ctx, args.statements, args.seed)
+                for name, entry in statements.items():
+                    print(f"  {name}: {entry['text']['mean_us']} -> {entry['prepared']['mean_us']} мкс, "
+                          f"планирование {entry['text']['planning_ms']} -> {entry['prepared']['planning_ms']} мс",
+                          file=sys.stderr)
+            else:
+                print('DB_PREPARED_STATEMENTS=0, --statements пропущен', file=sys.stderr)
+    finally:
+        db.close()
+
+    process = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    elif not scenarios:
+        host, port = None, None
+    else:
+        host, port = '127.0.0.1', free_port()
+        print(f'Запуск сервера ({args.server}) на порту {port}...', file=sys.stderr)
+        process = start_server(args.server, port, args.server_log)
+
+    if not ids and 'product_by_id' in scenarios:
+        scenarios.remove('product_by_id')
+    ctx.update(host=host, port=port)
+    result = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'server': 'external' if args.url else args.server,
+            'rows': rows,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'requests': args.requests,
+            'warmup_s': args.warmup,
+            'seed': args.seed,
+            'accept_encoding': args.accept_encoding,
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'env': {name: os.environ[name] for name in RECORDED_ENV if name in os.environ}
+        },
+        'scenarios': {}
+    }
+    if statements is not None:
+        result['statements'] = statements
+    try:
+        for name in scenarios:
+            print(f'Сценарий {name}...', file=sys.stderr)
+            stats = load(name, ctx, args)
+            result['scenarios'][name] = stats
+            latency = stats['latency_ms']
+            print(f"  {stats['throughput_rps']} rps, p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+                  f"p99 {latency['p99']} ms, ошибок {stats['errors']}", file=sys.stderr)
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f'Результат: {args.output}', file=sys.stderr)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(result, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
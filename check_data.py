@@ -5,11 +5,14 @@
 """
 
 import os
+import logging
 from dotenv import load_dotenv
 from database import Database
 
 # Load environment variables
 load_dotenv()
+# Database messages go to the console as plain lines
+logging.basicConfig(level=logging.INFO, format='%(message)s')
 
 # Initialize database
 db = Database()
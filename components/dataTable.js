@@ -28,6 +28,39 @@ class ApiService {
             throw error;
         }
     }
+
+    // Keyset pagination: pass either `after` or `before` cursor from a previous page
+    static async getProductsByCursor(limit = 10, { after = null, before = null } = {}) {
+        try {
+            const params = new URLSearchParams({ limit });
+            if (before) {
+                params.set('before', before);
+            } else {
+                params.set('after', after || '');
+            }
+            const url = `${window.API_BASE_URL}/products?${params.toString()}`;
+            console.log('Fetching products from:', url);
+            const response = await fetch(url, {
+                method: 'GET',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+            });
+
+            if (!response.ok) {
+                const errorText = await response.text();
+                console.error('API Error:', response.status, errorText);
+                throw new Error(`Failed to fetch products: ${response.status} ${errorText}`);
+            }
+
+            const data = await response.json();
+            console.log('Products API Response:', data);
+            return data;
+        } catch (error) {
+            console.error('Error fetching products:', error);
+            throw error;
+        }
+    }
 }
 
 class CustomDataTable extends HTMLElement {
@@ -37,10 +70,17 @@ class CustomDataTable extends HTMLElement {
         this.rowsPerPage = 10;
         this.totalPages = 1;
         this.totalItems = 0;
+        this.totalExact = true;
         this.isLoading = false;
+        // Cursor (keyset) mode: <custom-data-table pagination="cursor">
+        this.cursorMode = false;
+        this.nextCursor = null;
+        this.prevCursor = null;
+        this.pendingCursor = {};
     }
 
     async connectedCallback() {
+        this.cursorMode = this.getAttribute('pagination') === 'cursor';
         // Render into light DOM so DevTools / XPath can find the table
         this.render();
         await this.loadData();
@@ -228,6 +268,14 @@ class CustomDataTable extends HTMLElement {
         const rowsPerPageSelect = this.querySelector('#rows-per-page');
 
         prevButton?.addEventListener('click', () => {
+            if (this.cursorMode) {
+                if (this.prevCursor) {
+                    this.currentPage--;
+                    this.pendingCursor = { before: this.prevCursor };
+                    this.loadData();
+                }
+                return;
+            }
             if (this.currentPage > 1) {
                 this.currentPage--;
                 this.loadData();
@@ -235,6 +283,14 @@ class CustomDataTable extends HTMLElement {
         });
 
         nextButton?.addEventListener('click', () => {
+            if (this.cursorMode) {
+                if (this.nextCursor) {
+                    this.currentPage++;
+                    this.pendingCursor = { after: this.nextCursor };
+                    this.loadData();
+                }
+                return;
+            }
             if (this.currentPage < this.totalPages) {
                 this.currentPage++;
                 this.loadData();
@@ -244,6 +300,7 @@ class CustomDataTable extends HTMLElement {
         rowsPerPageSelect?.addEventListener('change', (e) => {
             this.rowsPerPage = parseInt(e.target.value);
             this.currentPage = 1;
+            this.pendingCursor = {};
             this.loadData();
         });
     }
@@ -253,7 +310,9 @@ class CustomDataTable extends HTMLElement {
         this.showLoading();
 
         try {
-            const response = await ApiService.getProducts(this.currentPage, this.rowsPerPage);
+            const response = this.cursorMode
+                ? await ApiService.getProductsByCursor(this.rowsPerPage, this.pendingCursor)
+                : await ApiService.getProducts(this.currentPage, this.rowsPerPage);
             console.log('Products API Response:', response);
             
             if (!response || !response.data) {
@@ -262,6 +321,15 @@ class CustomDataTable extends HTMLElement {
             
             this.totalItems = response.pagination.total;
             this.totalPages = response.pagination.totalPages;
+            this.totalExact = response.pagination.totalExact !== false;
+            if (this.cursorMode) {
+                this.nextCursor = response.pagination.nextCursor;
+                this.prevCursor = response.pagination.prevCursor;
+                // First page has no previous cursor
+                if (!this.prevCursor) {
+                    this.currentPage = 1;
+                }
+            }
             
             this.renderTable(response.data);
             this.updatePagination();
@@ -319,12 +387,24 @@ class CustomDataTable extends HTMLElement {
         const nextButton = this.querySelector('.next-button');
         const pageNumbers = this.querySelector('#page-numbers');
 
-        prevButton.disabled = this.currentPage === 1;
-        nextButton.disabled = this.currentPage === this.totalPages;
-
         // Clear existing page numbers
         pageNumbers.innerHTML = '';
 
+        if (this.cursorMode) {
+            // Cursor mode can only step to neighbouring pages
+            prevButton.disabled = !this.prevCursor;
+            nextButton.disabled = !this.nextCursor;
+
+            const label = document.createElement('span');
+            // Approximate totals (planner estimate) are prefixed with "~"
+            label.textContent = `Page ${this.currentPage} of ${this.totalExact ? '' : '~'}${this.totalPages}`;
+            pageNumbers.appendChild(label);
+            return;
+        }
+
+        prevButton.disabled = this.currentPage === 1;
+        nextButton.disabled = this.currentPage === this.totalPages;
+
         const maxVisiblePages = 5;
         let startPage, endPage;
 
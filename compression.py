@@ -0,0 +1,161 @@
+"""
+HTTP compression for the Flask and Quart apps.
+
+- Dynamic responses (JSON, text) larger than COMPRESS_MIN_SIZE are
+  compressed with the best encoding the client accepts: brotli when the
+  optional `brotli` package is installed, otherwise gzip.
+- Static assets (index.html, *.js, *.css) are read and compressed once,
+  at maximum level, and then served from memory. A file that changes on
+  disk is picked up again on its next request.
+
+Environment:
+    COMPRESSION=0         disable compression of dynamic responses
+    COMPRESS_MIN_SIZE     smallest body worth compressing, bytes (1024)
+    COMPRESS_LEVEL        gzip level for dynamic responses (6)
+    COMPRESS_BR_QUALITY   brotli quality for dynamic responses (5)
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Preferred first
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+ENABLED = os.getenv('COMPRESSION', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('COMPRESS_BR_QUALITY', 5))
+
+# Static files are compressed once, so spend the CPU on the smallest output
+STATIC_EXTENSIONS = ('.html', '.js', '.css', '.svg')
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(data, encoding, best=False):
+    """Compress bytes with 'br' or 'gzip'"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(data, compresslevel=9 if best else GZIP_LEVEL, mtime=0)
+
+
+def choose_encoding(accept_encodings):
+    """Best supported encoding from a werkzeug Accept-Encoding header, or None"""
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def wants_compression(response, encoding):
+    """Whether a dynamic response should be compressed (before reading its body)"""
+    return (
+        ENABLED
+        and encoding is not None
+        and response.status_code == 200
+        and not getattr(response, 'direct_passthrough', False)
+        and not getattr(response, 'is_streamed', False)
+        and 'Content-Encoding' not in response.headers
+        and is_compressible(response.mimetype)
+    )
+
+
+def apply_compression(response, data, encoding):
+    """Replace the body with its compressed form when that is worth it"""
+    response.vary.add('Accept-Encoding')
+    if len(data) < MIN_SIZE:
+        return response
+    compressed = compress(data, encoding)
+    if len(compressed) >= len(data):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class StaticAsset:
+    def __init__(self, path, mtime, data):
+        self.path = path
+        self.mtime = mtime
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.etag = hashlib.sha1(data).hexdigest()[:20]
+        self.variants = {None: data}
+        for encoding in ENCODINGS:
+            compressed = compress(data, encoding, best=True)
+            if len(compressed) < len(data):
+                self.variants[encoding] = compressed
+
+    def body(self, encoding):
+        """(encoding, bytes) for the chosen encoding, identity if it did not help"""
+        if encoding in self.variants:
+            return encoding, self.variants[encoding]
+        return None, self.variants[None]
+
+
+class StaticAssets:
+    """In-memory cache of static files with precompressed variants"""
+
+    def __init__(self, root, directories=('.', 'components')):
+        self.root = os.path.abspath(root)
+        self.directories = directories
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read and compress every static file up front (e.g. before workers fork)"""
+        for directory in self.directories:
+            full = os.path.join(self.root, directory)
+            if not os.path.isdir(full):
+                continue
+            for name in sorted(os.listdir(full)):
+                if name.endswith(STATIC_EXTENSIONS) and not name.startswith('.'):
+                    self._read(os.path.normpath(os.path.join(directory, name)))
+        sizes = [(len(a.variants[None]), min(len(v) for v in a.variants.values()))
+                 for a in self._assets.values()]
+        logger.info('Static assets loaded', extra={
+            'files': len(sizes),
+            'bytes': sum(s[0] for s in sizes),
+            'compressed_bytes': sum(s[1] for s in sizes),
+            'encodings': ', '.join(ENCODINGS)
+        })
+        return self
+
+    def _read(self, key):
+        full = os.path.join(self.root, key)
+        try:
+            mtime = os.stat(full).st_mtime
+            with open(full, 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self._assets.pop(key, None)
+            return None
+        asset = StaticAsset(key, mtime, data)
+        with self._lock:
+            self._assets[key] = asset
+        return asset
+
+    def get(self, directory, path):
+        """Cached asset for directory/path, None if it is not a known static file"""
+        key = os.path.normpath(os.path.join(directory, path))
+        asset = self._assets.get(key)
+        if asset is None:
+            return None
+        try:
+            changed = os.stat(os.path.join(self.root, key)).st_mtime != asset.mtime
+        except OSError:
+            changed = True
+        return self._read(key) if changed else asset
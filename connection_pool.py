@@ -0,0 +1,219 @@
+"""
+Thread-safe PostgreSQL connection pool with bounded waiting, health checks
+and usage counters.
+
+psycopg2's SimpleConnectionPool is not thread-safe and ThreadedConnectionPool
+raises PoolError as soon as maxconn connections are checked out. This pool
+blocks for up to `timeout` seconds instead, validates connections that sat
+idle, recycles connections older than `max_lifetime` and counts checkouts,
+wait time and exhaustion events.
+"""
+
+import threading
+import time
+import psycopg2
+from psycopg2 import extensions, pool
+
+
+class PoolTimeout(pool.PoolError):
+    """No connection became available within the pool timeout"""
+
+
+class BoundedConnectionPool:
+    def __init__(self, minconn, maxconn, *args, timeout=10.0, max_lifetime=1800.0,
+                 check_idle=30.0, **kwargs):
+        """Open `minconn` connections now; connect(*args, **kwargs) is used for new ones"""
+        if maxconn < 1 or minconn > maxconn:
+            raise ValueError('expected 0 <= minconn <= maxconn and maxconn >= 1')
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_idle = check_idle
+        self.closed = False
+        self._args = args
+        self._kwargs = kwargs
+
+        self._cond = threading.Condition()
+        self._idle = []          # LIFO stack of idle connections
+        self._in_use = {}        # id(conn) -> conn
+        self._created_at = {}    # id(conn) -> monotonic time
+        self._returned_at = {}   # id(conn) -> monotonic time
+        self._size = 0           # open + being opened connections
+
+        # Counters
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+        self.exhausted = 0       # checkouts that had to wait for a connection
+        self.timeouts = 0
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.recycled = 0        # closed because of max_lifetime
+        self.health_check_failures = 0
+
+        for _ in range(minconn):
+            self._size += 1
+            self._idle.append(self._connect())
+
+    def _connect(self):
+        conn = psycopg2.connect(*self._args, **self._kwargs)
+        now = time.monotonic()
+        with self._cond:
+            self._created_at[id(conn)] = now
+            self._returned_at[id(conn)] = now
+            self.connections_created += 1
+        return conn
+
+    def _forget(self, conn):
+        """Drop bookkeeping for a connection (caller holds the lock)"""
+        self._created_at.pop(id(conn), None)
+        self._returned_at.pop(id(conn), None)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._forget(conn)
+            self.connections_closed += 1
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _healthy(self, conn):
+        """Cheap check for connections that sat idle for a while"""
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if now - self._created_at.get(id(conn), now) > self.max_lifetime:
+            self.recycled += 1
+            return False
+        if now - self._returned_at.get(id(conn), now) < self.check_idle:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            self.health_check_failures += 1
+            return False
+
+    def getconn(self, key=None, timeout=None):
+        """Check out a connection, waiting up to `timeout` seconds (raises PoolTimeout)"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._cond:
+            waited = False
+            while True:
+                if self.closed:
+                    raise pool.PoolError('connection pool is closed')
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    # Reserve the slot, connect outside the lock
+                    self._size += 1
+                    conn = None
+                    break
+                if not waited:
+                    self.exhausted += 1
+                    waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f'no connection available within {timeout:.1f}s '
+                        f'(pool size {self.maxconn})'
+                    )
+                self._cond.wait(remaining)
+
+        try:
+            if conn is not None and not self._healthy(conn):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            self._release_slot()
+            raise
+
+        waited_for = time.monotonic() - started
+        with self._cond:
+            self._in_use[id(conn)] = conn
+            self.checkouts += 1
+            self.wait_seconds_total += waited_for
+            self.max_wait_seconds = max(self.max_wait_seconds, waited_for)
+        return conn
+
+    def putconn(self, conn, key=None, close=False):
+        """Return a connection; broken, in-transaction or expired ones are handled here"""
+        with self._cond:
+            if self.closed:
+                # closeall() already closed it
+                return
+            if self._in_use.pop(id(conn), None) is None:
+                raise pool.PoolError('trying to put unkeyed connection')
+
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+        now = time.monotonic()
+        if not close and now - self._created_at.get(id(conn), now) > self.max_lifetime:
+            self.recycled += 1
+            close = True
+
+        if close or conn.closed:
+            self._close(conn)
+            self._release_slot()
+            return
+
+        with self._cond:
+            self._returned_at[id(conn)] = now
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        """Close every connection, including the ones currently checked out"""
+        with self._cond:
+            self.closed = True
+            connections = self._idle + list(self._in_use.values())
+            self._idle = []
+            self._in_use = {}
+            self._size = 0
+            self._cond.notify_all()
+        for conn in connections:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'min': self.minconn,
+                'max': self.maxconn,
+                'timeout': self.timeout,
+                'checkouts': self.checkouts,
+                'wait_seconds_total': round(self.wait_seconds_total, 6),
+                'max_wait_seconds': round(self.max_wait_seconds, 6),
+                'exhausted': self.exhausted,
+                'timeouts': self.timeouts,
+                'connections_created': self.connections_created,
+                'connections_closed': self.connections_closed,
+                'recycled': self.recycled,
+                'health_check_failures': self.health_check_failures
+            }
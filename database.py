@@ -1,16 +1,245 @@
 import os
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from psycopg2 import pool
-import random
-from datetime import datetime, timedelta, date
+import functools
+import threading
+import time
+import csv
+import logging
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import date
+from product_io import validate_product, copy_line
+from connection_pool import BoundedConnectionPool
+from product_generator import CHUNK_ROWS, DEFAULT_DAYS, DEFAULT_SEED, generate_products
+import metrics
+from replicas import Replica, ReplicaSet, holding_replica, replica_dsns, replica_read
+from snapshots import Snapshot, SnapshotStore
+from partitions import DEFAULT_PARTITION, add_months, month_start, months, partition_month, partition_name
+from queries import (
+    format_product, decode_cursor, keyset_query, keyset_page,
+    product_columns, product_dicts, PRODUCT_KEYS, product_by_id_query,
+    page_query, count_query, estimate_query, plan_rows,
+    COUNT_SQL, COUNTER_SQL, ESTIMATE_SQL, DATA_VERSION_SQL, data_version,
+    LINE_CHART_SQL, line_chart_query, line_chart_result,
+    BAR_CHART_SQL, PIE_CHART_SQL, count_chart_result,
+    DASHBOARD_SQL, dashboard_result,
+    search_prefix_query, search_substring_query, search_result,
+    PREPARED_STATEMENTS, prepare_statement_sql, prepared_call
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CopySource:
+    """File-like object feeding COPY ... FROM STDIN from an iterator of lines.
+
+    Reads (line_number, text) pairs lazily and stops after `limit` rows so
+    each COPY covers one chunk; only one read() worth of text is in memory.
+    """
+
+    def __init__(self, lines, limit):
+        self.lines = lines
+        self.limit = limit
+        self.rows = 0
+        self.first_line = None
+        self.last_line = None
+        self.exhausted = False
+
+    def read(self, size=-1):
+        size = size if size and size > 0 else 65536
+        parts = []
+        length = 0
+        while length < size and self.rows < self.limit:
+            try:
+                line_number, text = next(self.lines)
+            except StopIteration:
+                self.exhausted = True
+                break
+            if self.first_line is None:
+                self.first_line = line_number
+            self.last_line = line_number
+            self.rows += 1
+            parts.append(text)
+            length += len(text)
+        return ''.join(parts)
+
+    readline = read
+
+
+class QueryCache:
+    """Small thread-safe LRU cache with TTL for query results.
+
+    Entries are tagged with the data version they were computed at; a write
+    bumps the version so older entries are never served again.
+    """
+
+    def __init__(self, max_size=128, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, key):
+        """Return (found, value) for key at the current version"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                version, expires_at, value = entry
+                if version == self.version and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, version):
+        """Store value computed at `version` (dropped if a write happened meanwhile)"""
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump_version(self):
+        """Invalidate everything cached so far (called after writes)"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            return self.version
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'version': self.version,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+def cached_query(method):
+    """Memoize a read-only Database method in Database.query_cache"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = self.query_cache
+        if not cache.enabled:
+            return method(self, *args, **kwargs)
+        
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        found, value = cache.get(key)
+        if found:
+            return value
+        
+        # Read the version before querying so a concurrent write wins
+        version = cache.version
+        value = method(self, *args, **kwargs)
+        cache.set(key, value, version)
+        return value
+    return wrapper
+
 
 class Database:
+    COUNT_STRATEGIES = ('exact', 'estimate', 'counter')
+    PARTITIONING_MODES = ('none', 'monthly')
+
+    # pg_advisory_lock key serializing create_tables() across processes
+    SCHEMA_LOCK_ID = 7246001
+
     def __init__(self):
         self.connection_pool = None
+        self.dsn = None
+        self.tables_ready = False
+        self._init_lock = threading.Lock()
+        # A forked worker must not use (or close) the parent's sockets; it
+        # gets its own pool on first use
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+        # How /api/products computes its total:
+        #   exact    - SELECT COUNT(*) (full scan on large tables)
+        #   estimate - planner estimate from pg_class.reltuples
+        #   counter  - row in row_counts kept in step by triggers
+        self.count_strategy = os.getenv('PRODUCTS_COUNT_STRATEGY', 'exact').strip().lower()
+        if self.count_strategy not in self.COUNT_STRATEGIES:
+            logger.warning('Unknown PRODUCTS_COUNT_STRATEGY "%s", using exact', self.count_strategy)
+            self.count_strategy = 'exact'
+        # Below this estimate an exact count is cheap enough to run anyway
+        self.count_exact_threshold = int(os.getenv('PRODUCTS_COUNT_EXACT_THRESHOLD', 10000))
+        # Chart endpoints are served from snapshots refreshed in the
+        # background (see snapshots.py)
+        self.snapshots = SnapshotStore()
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_wake = threading.Event()
+        self._snapshot_inflight = {}  # key -> Future of the computation running for it
+        self._refresher = None
+        # Without snapshots (CHART_REFRESH_INTERVAL=0) chart results are
+        # cached per process instead (CHART_CACHE_TTL=0 disables). The TTL
+        # bounds staleness from writes made by other processes.
+        self.query_cache = QueryCache(
+            max_size=int(os.getenv('CHART_CACHE_SIZE', 128)),
+            ttl=0 if self.snapshots.enabled else float(os.getenv('CHART_CACHE_TTL', 30))
+        )
+        # Name search: hard per-request latency budget and result cap, plus
+        # a short-lived cache for repeated (typeahead) queries
+        self.search_timeout_ms = int(os.getenv('SEARCH_TIMEOUT_MS', 200))
+        self.search_max_results = int(os.getenv('SEARCH_MAX_RESULTS', 20))
+        self.search_cache = QueryCache(
+            max_size=int(os.getenv('SEARCH_CACHE_SIZE', 256)),
+            ttl=float(os.getenv('SEARCH_CACHE_TTL', 10))
+        )
+        # Hot queries (queries.PREPARED_STATEMENTS) are prepared once per
+        # pooled connection and run with EXECUTE, skipping parse and plan.
+        # DB_PREPARED_STATEMENTS=0 sends them as plain text (needed behind
+        # a transaction-pooling PgBouncer).
+        self.prepared_statements = os.getenv('DB_PREPARED_STATEMENTS', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+        # connection -> names of the statements prepared on it
+        self._prepared = weakref.WeakKeyDictionary()
+        # Read replicas (DB_REPLICA_DSNS, see replicas.py); connect() opens
+        # their pools
+        self.replica_set = ReplicaSet()
+        self.replica_errors = (psycopg2.OperationalError, psycopg2.InterfaceError)
+        self._replica_conns = {}  # id(conn) -> Replica it came from
+        # PRODUCTS_PARTITIONING=monthly creates products range-partitioned
+        # by month on date (see partitions.py). Partitions are kept
+        # PRODUCTS_PARTITIONS_AHEAD months ahead (3); with
+        # PRODUCTS_PARTITION_RETENTION_MONTHS > 0 older ones are detached
+        # (and dropped with PRODUCTS_PARTITION_DROP=1).
+        self.partitioning = os.getenv('PRODUCTS_PARTITIONING', 'none').strip().lower()
+        if self.partitioning not in self.PARTITIONING_MODES:
+            logger.warning('Unknown PRODUCTS_PARTITIONING "%s", using none', self.partitioning)
+            self.partitioning = 'none'
+        self.partitions_ahead = int(os.getenv('PRODUCTS_PARTITIONS_AHEAD', 3))
+        self.partition_retention = int(os.getenv('PRODUCTS_PARTITION_RETENTION_MONTHS', 0))
+        self.partition_drop = os.getenv('PRODUCTS_PARTITION_DROP', '0').strip().lower() in ('1', 'true', 'yes', 'on')
+        # Maintenance skips a partition rather than queue behind long queries
+        self.partition_lock_timeout_ms = int(os.getenv('PRODUCTS_PARTITION_LOCK_TIMEOUT_MS', 5000))
 
     def init(self):
         """Initialize database connection pool and create tables"""
+        self.connect()
+        if not self.tables_ready:
+            self.create_tables()
+
+    def connect(self):
+        """Create the connection pool for this process"""
         try:
             # Get environment variables and handle encoding issues
             db_host = os.getenv('DB_HOST', 'localhost')
@@ -84,56 +313,204 @@ class Database:
             # Build connection string (DSN)
             # This is more reliable for handling special characters and encoding issues
             dsn = f"host={db_host} port={db_port} dbname={db_name} user={db_user} password={db_password}"
+            # Kept for connections opened outside the pool (async mode, workers)
+            self.dsn = dsn
+            
+            # Pool settings
+            #   DB_POOL_MODE=bounded (default) - thread-safe, waits up to
+            #     DB_POOL_TIMEOUT seconds for a free connection, checks
+            #     connections idle for DB_POOL_CHECK_IDLE seconds and recycles
+            #     them after DB_POOL_MAX_LIFETIME seconds
+            #   DB_POOL_MODE=simple - psycopg2 SimpleConnectionPool (single thread only)
+            pool_mode = os.getenv('DB_POOL_MODE', 'bounded').strip().lower()
+            pool_min = int(os.getenv('DB_POOL_MIN', 1))
+            pool_max = int(os.getenv('DB_POOL_MAX', 20))
+            
+            if pool_mode == 'simple':
+                pool_class = psycopg2.pool.SimpleConnectionPool
+                pool_options = {}
+            else:
+                pool_class = BoundedConnectionPool
+                pool_options = {
+                    'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                    'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+                    'check_idle': float(os.getenv('DB_POOL_CHECK_IDLE', 30))
+                }
             
             # Create connection pool using connection string as first positional argument
             # SimpleConnectionPool(minconn, maxconn, dsn) - dsn must be first positional after min/max
             try:
                 # Try with connection string as positional argument
-                self.connection_pool = psycopg2.pool.SimpleConnectionPool(1, 20, dsn)
+                self.connection_pool = pool_class(pool_min, pool_max, dsn, **pool_options)
             except (TypeError, AttributeError):
                 # Fallback: use individual parameters if connection string doesn't work
                 # This should work but may have encoding issues with special characters
-                self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-                    1, 20,
+                self.connection_pool = pool_class(
+                    pool_min, pool_max,
                     host=db_host,
                     port=db_port,
                     database=db_name,
                     user=db_user,
-                    password=db_password
+                    password=db_password,
+                    **pool_options
                 )
             
             if self.connection_pool:
-                print('Connected to PostgreSQL database')
-                self.create_tables()
+                logger.info('Connected to PostgreSQL database', extra={'pid': os.getpid(), 'pool_max': pool_max})
             else:
                 raise Exception('Failed to create connection pool')
+            
+            # Replica pools start empty: a replica that is down must not
+            # stop the app from starting
+            replica_max = int(os.getenv('DB_REPLICA_POOL_MAX', pool_max))
+            replica_set = ReplicaSet()
+            replica_set.replicas = [
+                Replica(replica_dsn, pool_class(
+                    0, replica_max, replica_dsn,
+                    connect_timeout=replica_set.connect_timeout, **pool_options
+                ))
+                for replica_dsn in replica_dsns(dsn)
+            ]
+            self.replica_set = replica_set
+            if replica_set:
+                logger.info('Reading from replicas: %s', ', '.join(r.name for r in replica_set.replicas))
                 
         except Exception as e:
             error_msg = str(e)
-            print(f'Error connecting to database: {error_msg}')
-            print(f'DB_HOST: {db_host}')
-            print(f'DB_PORT: {db_port}')
-            print(f'DB_NAME: {db_name[:20]}...' if len(db_name) > 20 else f'DB_NAME: {db_name}')
-            print(f'DB_USER: {db_user[:20]}...' if len(db_user) > 20 else f'DB_USER: {db_user}')
-            print(f'DB_PASSWORD: {"*" * len(db_password)}')
+            logger.error('Error connecting to database: %s', error_msg, extra={
+                'db_host': db_host,
+                'db_port': db_port,
+                'db_name': f'{db_name[:20]}...' if len(db_name) > 20 else db_name,
+                'db_user': f'{db_user[:20]}...' if len(db_user) > 20 else db_user,
+                'db_password': '*' * len(db_password)
+            })
             
             # If it's a Unicode error, provide more helpful message
             if 'UnicodeDecodeError' in error_msg or 'utf-8' in error_msg.lower():
-                print('\n⚠️  Проблема с кодировкой!')
-                print('Попробуйте:')
-                print('1. Убедитесь, что файл .env сохранен в UTF-8')
-                print('2. Проверьте, нет ли специальных символов в пароле/имени пользователя')
-                print('3. Попробуйте использовать только латинские буквы и цифры в пароле')
+                logger.warning(
+                    '⚠️  Проблема с кодировкой! Попробуйте:\n'
+                    '1. Убедитесь, что файл .env сохранен в UTF-8\n'
+                    '2. Проверьте, нет ли специальных символов в пароле/имени пользователя\n'
+                    '3. Попробуйте использовать только латинские буквы и цифры в пароле'
+                )
             
             raise e
 
+    def _after_fork(self):
+        """Drop the parent's pool in a freshly forked child"""
+        self._init_lock = threading.Lock()
+        # The refresher thread does not survive the fork
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_wake = threading.Event()
+        self._snapshot_inflight = {}
+        self._refresher = None
+        if self.connection_pool is not None:
+            # Keep the inherited pool referenced but unused: closing it here
+            # would terminate the parent's server sessions over shared sockets
+            self._inherited_pool = self.connection_pool
+            self.connection_pool = None
+            self._inherited_replicas = self.replica_set
+            self.replica_set = ReplicaSet()
+            self._replica_conns = {}
+
     def get_connection(self):
-        """Get a connection from the pool"""
-        return self.connection_pool.getconn()
+        """Get a connection from the pool (the pool is created on first use in each process)
+
+        Inside a replica_read method the connection comes from a replica
+        when one may serve the read (ReplicaSet.candidates).
+        """
+        if self.connection_pool is None:
+            with self._init_lock:
+                if self.connection_pool is None:
+                    self.init()
+        conn = None
+        for replica in self.replica_set.candidates():
+            started = time.perf_counter()
+            try:
+                if isinstance(replica.connection_pool, BoundedConnectionPool):
+                    # Don't wait DB_POOL_TIMEOUT for a busy replica: the next
+                    # one or the primary serves the read
+                    conn = replica.connection_pool.getconn(timeout=0)
+                else:
+                    conn = replica.connection_pool.getconn()
+            except psycopg2.OperationalError as e:
+                self.replica_set.failed(replica, e)
+                continue
+            except pool.PoolError:
+                # Exhausted, not broken
+                continue
+            metrics.POOL_WAIT.observe(time.perf_counter() - started)
+            self.replica_set.served(replica)
+            self._replica_conns[id(conn)] = replica
+            break
+        if conn is None:
+            started = time.perf_counter()
+            conn = self.connection_pool.getconn()
+            metrics.POOL_WAIT.observe(time.perf_counter() - started)
+            self.replica_set.served(None)
+        # Once the schema exists, new connections prepare the hot statements
+        if self.prepared_statements and self.tables_ready and conn not in self._prepared:
+            self._prepare(conn)
+        return conn
 
     def return_connection(self, conn):
-        """Return a connection to the pool"""
-        self.connection_pool.putconn(conn)
+        """Return a connection to the pool it came from"""
+        replica = self._replica_conns.pop(id(conn), None)
+        if replica is not None:
+            replica.connection_pool.putconn(conn)
+        else:
+            self.connection_pool.putconn(conn)
+
+    def _after_write(self):
+        """Invalidate cached reads; this process reads from the primary for a while"""
+        self.replica_set.wrote()
+        self.query_cache.bump_version()
+        self._snapshot_wake.set()
+
+    def _prepare(self, conn):
+        """PREPARE the hot statements on a connection (each one that fails stays plain text)"""
+        names = set()
+        conn.autocommit = True
+        try:
+            cursor = conn.cursor()
+            # Plan each statement once: with LIMIT $n the planner would keep
+            # re-planning per call. The setting is read at execution time, so
+            # it stays on for the whole session of the pooled connection: it
+            # also applies to the plans PL/pgSQL caches for the trigger
+            # functions (row counter, table versions, daily_sales) run on it.
+            # Their statements have no parameters apart from the table_versions
+            # key, so the generic plan is the plan they would get anyway.
+            # Plain text queries are planned per call either way.
+            cursor.execute("SET plan_cache_mode = 'force_generic_plan'")
+            for sql, (name, _, _) in PREPARED_STATEMENTS.items():
+                try:
+                    cursor.execute(prepare_statement_sql(sql))
+                    names.add(name)
+                except psycopg2.Error as e:
+                    # e.g. row_counts does not exist unless the counter is installed
+                    logger.debug('Statement %s not prepared: %s', name, str(e).splitlines()[0])
+            cursor.close()
+        finally:
+            conn.autocommit = False
+        self._prepared[conn] = names
+
+    def _execute(self, conn, cursor, sql, params=None):
+        """cursor.execute(), through EXECUTE when `sql` is prepared on `conn`"""
+        call = prepared_call(sql, params)
+        if call is not None and call[0] in self._prepared.get(conn, ()):
+            cursor.execute(call[1], call[2])
+        else:
+            cursor.execute(sql, params)
+
+    def get_pool_stats(self):
+        """Pool counters (bounded pool only), plus per-replica read counters"""
+        if isinstance(self.connection_pool, BoundedConnectionPool):
+            stats = self.connection_pool.stats()
+        else:
+            stats = {'mode': 'simple'}
+        if self.replica_set:
+            stats['replicas'] = self.replica_set.stats()
+        return stats
 
     def create_tables(self):
         """Create tables if they don't exist"""
@@ -142,6 +519,10 @@ class Database:
             conn = self.get_connection()
             cursor = conn.cursor()
             
+            # Workers that start together wait here instead of racing on
+            # CREATE ... IF NOT EXISTS and the trigger checks below
+            cursor.execute('SELECT pg_advisory_lock(%s)', (self.SCHEMA_LOCK_ID,))
+            
             # Note: GRANT commands require superuser privileges
             # If you get permission errors, run the SQL commands from fix_permissions.sql
             # as a PostgreSQL superuser (usually 'postgres')
@@ -159,116 +540,840 @@ class Database:
                 )
             """
             
-            cursor.execute(create_products_table)
+            kind = self._products_kind(cursor)
+            if kind is None and self.partitioning == 'monthly':
+                self._create_partitioned_products(cursor)
+            else:
+                cursor.execute(create_products_table)
+                if kind == 'r' and self.partitioning == 'monthly':
+                    logger.warning(
+                        'products is not partitioned yet, run "python manage_partitions.py --migrate" '
+                        'to convert it'
+                    )
+            self._create_product_indexes(cursor)
             conn.commit()
-            print('Products table ready')
+            logger.info('Products table ready')
+            
+            self.setup_row_counter(conn, cursor)
+            self.setup_table_version(conn, cursor)
+            self.setup_daily_sales(conn, cursor)
+            self.setup_search(conn, cursor)
             
             # Check if table is empty and seed with sample data
-            cursor.execute('SELECT COUNT(*) as count FROM products')
-            count = cursor.fetchone()[0]
+            # (EXISTS stops at the first row instead of counting the table)
+            cursor.execute('SELECT EXISTS (SELECT 1 FROM products)')
+            has_rows = cursor.fetchone()[0]
             
-            if count == 0:
-                print('Seeding database with sample data...')
+            if not has_rows:
+                logger.info('Seeding database with sample data...')
                 self.seed_data(conn, cursor)
             
+            if self._products_kind(cursor) == 'p':
+                self._maintain_partitions(conn, cursor)
+            
             cursor.close()
+            self.tables_ready = True
             
         except Exception as e:
             error_msg = str(e)
-            print(f'Error creating tables: {e}')
+            logger.error('Error creating tables: %s', e)
             
             # Provide helpful message for permission errors
             if 'нет доступа' in error_msg or 'permission denied' in error_msg.lower() or 'insufficient privilege' in error_msg.lower():
-                print('\n⚠️  Проблема с правами доступа!')
-                print('Пользователь не имеет прав на создание таблиц в схеме public.')
-                print('\nРешение:')
-                print('1. Подключитесь к PostgreSQL как суперпользователь (обычно postgres):')
-                print('   psql -U postgres -d postgres')
-                print('\n2. Выполните следующие команды:')
                 db_user = os.getenv('DB_USER', 'testGr')
-                print(f'   GRANT USAGE ON SCHEMA public TO {db_user};')
-                print(f'   GRANT CREATE ON SCHEMA public TO {db_user};')
-                print(f'   GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO {db_user};')
-                print(f'   ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT ALL ON TABLES TO {db_user};')
-                print('\nИли используйте файл fix_permissions.sql')
+                logger.warning(
+                    '⚠️  Проблема с правами доступа!\n'
+                    'Пользователь не имеет прав на создание таблиц в схеме public.\n'
+                    'Решение:\n'
+                    '1. Подключитесь к PostgreSQL как суперпользователь (обычно postgres):\n'
+                    '   psql -U postgres -d postgres\n'
+                    '2. Выполните следующие команды:\n'
+                    f'   GRANT USAGE ON SCHEMA public TO {db_user};\n'
+                    f'   GRANT CREATE ON SCHEMA public TO {db_user};\n'
+                    f'   GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO {db_user};\n'
+                    f'   ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT ALL ON TABLES TO {db_user};\n'
+                    'Или используйте файл fix_permissions.sql'
+                )
             
             if conn:
                 conn.rollback()
             raise e
         finally:
             if conn:
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute('SELECT pg_advisory_unlock(%s)', (self.SCHEMA_LOCK_ID,))
+                    conn.commit()
+                    cursor.close()
+                except psycopg2.Error:
+                    pass
                 self.return_connection(conn)
 
-    def seed_data(self, conn, cursor):
-        """Seed database with sample data (dates distributed across past ~7 months)"""
-        categories = ['Electronics', 'Clothing', 'Food', 'Furniture', 'Books']
-        statuses = ['Completed', 'Pending', 'Cancelled']
+    def _create_product_indexes(self, cursor):
+        """Indexes of products (on a partitioned table they cascade to every partition)"""
+        # Range scans for the charts and date-filtered listings
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS products_status_date_idx ON products (status, date)'
+        )
+        # Filtered / sorted listings: (column, id) matches the ORDER BY
+        # and keyset comparison used by get_products_by_cursor
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS products_category_id_idx ON products (category, id)'
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS products_date_id_idx ON products (date, id)'
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS products_amount_id_idx ON products (amount, id)'
+        )
+
+    def _products_kind(self, cursor):
+        """pg_class.relkind of products: 'r' plain table, 'p' partitioned, None if missing"""
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('products')")
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _create_partitioned_products(self, cursor, sequence='products_id_seq'):
+        """Create products partitioned by month on date, with its default partition.
+
+        The primary key of a partitioned table has to contain the partition
+        key, so it is (id, date); ids still come from one sequence. Monthly
+        partitions are added by _maintain_partitions.
+        """
+        cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {sequence} AS INTEGER')
+        cursor.execute(f"""
+            CREATE TABLE products (
+                id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+                name VARCHAR(255) NOT NULL,
+                category VARCHAR(100) NOT NULL,
+                status VARCHAR(50) NOT NULL,
+                amount DECIMAL(10, 2) NOT NULL,
+                date DATE NOT NULL,
+                rating INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id, date)
+            ) PARTITION BY RANGE (date)
+        """)
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY products.id')
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF products DEFAULT')
+        logger.info('Created products partitioned by month')
+
+    def _partitions(self, cursor):
+        """{first day of month: partition name} of the attached monthly partitions"""
+        cursor.execute("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'products'::regclass
+        """)
+        found = {}
+        for (name,) in cursor.fetchall():
+            month = partition_month(name)
+            if month is not None:
+                found[month] = name
+        return found
+
+    def _partition_cutoff(self):
+        """Months before this date are past retention (None: keep everything)"""
+        if self.partition_retention <= 0:
+            return None
+        return add_months(month_start(date.today()), -self.partition_retention)
+
+    def _create_partition(self, cursor, month):
+        """Add the partition for `month` (the caller commits).
+
+        The table is filled and then attached rather than created with
+        PARTITION OF: ATTACH takes a weaker lock on products, so reads and
+        writes keep going. Rows of that month already sitting in the
+        default partition move into it.
+        """
+        name = partition_name(month)
+        bounds = (month, add_months(month, 1))
+        cursor.execute(f'CREATE TABLE {name} (LIKE products INCLUDING DEFAULTS)')
+        cursor.execute(f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """, bounds)
+        # With a matching CHECK in place ATTACH does not scan the table
+        cursor.execute(f'ALTER TABLE {name} ADD CONSTRAINT {name}_range CHECK (date >= %s AND date < %s)', bounds)
+        cursor.execute(f'ALTER TABLE products ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', bounds)
+        cursor.execute(f'ALTER TABLE {name} DROP CONSTRAINT {name}_range')
+        return name
+
+    def _detach_partition(self, cursor, name, month):
+        """Detach (or drop) an expired partition (the caller commits).
+
+        Detaching deletes no rows, so the statement triggers do not run:
+        daily_sales, row_counts and the data version are adjusted here.
+        """
+        cursor.execute(f'ALTER TABLE products DETACH PARTITION {name}')
+        cursor.execute(
+            'DELETE FROM daily_sales WHERE day >= %s AND day < %s',
+            (month, add_months(month, 1))
+        )
+        cursor.execute("SELECT to_regclass('row_counts') IS NOT NULL")
+        if cursor.fetchone()[0]:
+            cursor.execute(
+                f'UPDATE row_counts SET row_count = row_count - (SELECT COUNT(*) FROM {name}) '
+                "WHERE table_name = 'products'"
+            )
+        cursor.execute("UPDATE table_versions SET version = version + 1 WHERE table_name = 'products'")
+        if self.partition_drop:
+            cursor.execute(f'DROP TABLE {name}')
+
+    def _maintain_partitions(self, conn, cursor, first=None, last=None):
+        """Create missing monthly partitions and retire expired ones.
+
+        Creates the partitions from this month to PRODUCTS_PARTITIONS_AHEAD
+        months ahead, one for every month with rows in the default
+        partition, and those from `first` to `last` when given. Each
+        partition is its own transaction: one that cannot get its lock
+        within PRODUCTS_PARTITION_LOCK_TIMEOUT_MS is left for the next run.
+        Returns {'created': [...], 'detached': [...], 'deleted': rows}.
+        """
+        current = month_start(date.today())
+        cutoff = self._partition_cutoff()
+        wanted = set(months(current, add_months(current, self.partitions_ahead)))
+        if first is not None:
+            wanted.update(months(first, last or first))
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', date)::date FROM {DEFAULT_PARTITION}")
+        wanted.update(row[0] for row in cursor.fetchall())
+        if cutoff is not None:
+            wanted = {month for month in wanted if month >= cutoff}
+        
+        result = {'created': [], 'detached': [], 'deleted': 0}
+        cursor.execute('SET lock_timeout = %s', (self.partition_lock_timeout_ms,))
+        try:
+            existing = self._partitions(cursor)
+            for month in sorted(wanted - existing.keys()):
+                try:
+                    result['created'].append(self._create_partition(cursor, month))
+                    conn.commit()
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    logger.warning('Partition %s not created: %s', partition_name(month), str(e).splitlines()[0])
+            
+            if cutoff is not None:
+                expired = sorted((month, name) for month, name in existing.items() if month < cutoff)
+                for month, name in expired:
+                    try:
+                        self._detach_partition(cursor, name, month)
+                        conn.commit()
+                        result['detached'].append(name)
+                    except psycopg2.Error as e:
+                        conn.rollback()
+                        logger.warning('Partition %s not detached: %s', name, str(e).splitlines()[0])
+                # Expired rows left in the default partition; only once no
+                # expired partition is attached, so this never turns into
+                # the bulk DELETE that detaching avoids
+                if len(result['detached']) == len(expired):
+                    cursor.execute('DELETE FROM products WHERE date < %s', (cutoff,))
+                    result['deleted'] = cursor.rowcount
+                    conn.commit()
+        finally:
+            conn.rollback()
+            cursor.execute('RESET lock_timeout')
+            conn.commit()
+        
+        if result['created'] or result['detached']:
+            logger.info(
+                'Partitions created: %s; %s: %s',
+                ', '.join(result['created']) or '-',
+                'dropped' if self.partition_drop else 'detached',
+                ', '.join(result['detached']) or '-'
+            )
+        return result
+
+    def setup_row_counter(self, conn, cursor):
+        """Install (or remove) the trigger-maintained row counter for products"""
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'products_row_count_ins')"
+        )
+        installed = cursor.fetchone()[0]
         
-        insert_query = """
-            INSERT INTO products (name, category, status, amount, date, rating)
-            VALUES (%s, %s, %s, %s, %s, %s)
+        if self.count_strategy != 'counter':
+            if installed:
+                # Triggers cost every write, drop them when nobody reads the counter
+                cursor.execute('DROP TRIGGER IF EXISTS products_row_count_ins ON products')
+                cursor.execute('DROP TRIGGER IF EXISTS products_row_count_del ON products')
+                cursor.execute('DROP TRIGGER IF EXISTS products_row_count_trunc ON products')
+                cursor.execute("DELETE FROM row_counts WHERE table_name = 'products'")
+                conn.commit()
+                logger.info('Products row counter removed')
+            return
+        
+        if installed:
+            return
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS row_counts (
+                table_name VARCHAR(63) PRIMARY KEY,
+                row_count BIGINT NOT NULL
+            )
+        """)
+        
+        # Statement-level triggers with transition tables: one UPDATE per
+        # statement, not per row, so multi-row inserts stay cheap
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION products_row_count() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    UPDATE row_counts SET row_count = row_count + (SELECT COUNT(*) FROM new_rows)
+                    WHERE table_name = 'products';
+                ELSIF TG_OP = 'DELETE' THEN
+                    UPDATE row_counts SET row_count = row_count - (SELECT COUNT(*) FROM old_rows)
+                    WHERE table_name = 'products';
+                ELSE
+                    UPDATE row_counts SET row_count = 0 WHERE table_name = 'products';
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        
+        # Block writers while the counter is initialised so it can't drift
+        cursor.execute('LOCK TABLE products IN SHARE ROW EXCLUSIVE MODE')
+        cursor.execute("""
+            CREATE TRIGGER products_row_count_ins AFTER INSERT ON products
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION products_row_count()
+        """)
+        cursor.execute("""
+            CREATE TRIGGER products_row_count_del AFTER DELETE ON products
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION products_row_count()
+        """)
+        cursor.execute("""
+            CREATE TRIGGER products_row_count_trunc AFTER TRUNCATE ON products
+            FOR EACH STATEMENT EXECUTE FUNCTION products_row_count()
+        """)
+        cursor.execute("""
+            INSERT INTO row_counts (table_name, row_count)
+            SELECT 'products', COUNT(*) FROM products
+            ON CONFLICT (table_name) DO UPDATE SET row_count = EXCLUDED.row_count
+        """)
+        conn.commit()
+        logger.info('Products row counter installed')
+
+    def setup_table_version(self, conn, cursor):
+        """Install the trigger that bumps table_versions on every write to products"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS table_versions (
+                table_name VARCHAR(63) PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("""
+            INSERT INTO table_versions (table_name, version) VALUES ('products', 0)
+            ON CONFLICT (table_name) DO NOTHING
+        """)
+        
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'products_version')"
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute("""
+                CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+                BEGIN
+                    UPDATE table_versions SET version = version + 1
+                    WHERE table_name = TG_TABLE_NAME;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            # Once per statement, so bulk writes bump the version only once
+            cursor.execute("""
+                CREATE TRIGGER products_version
+                AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON products
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+            """)
+        conn.commit()
+
+    def setup_search(self, conn, cursor):
+        """Indexes for /api/products/search.
+
+        Prefix matches use a C-collated btree on lower(name), which serves
+        both LIKE 'abc%' and the name ordering. Substring matches use a
+        pg_trgm GIN index; without the extension they still work, as a scan
+        bounded by SEARCH_TIMEOUT_MS.
         """
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS products_name_prefix_idx '
+            'ON products ((lower(name) COLLATE "C"), id)'
+        )
+        conn.commit()
+        try:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS products_name_trgm_idx '
+                'ON products USING gin (name gin_trgm_ops)'
+            )
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.warning('pg_trgm is not available, substring search will not be indexed: %s', str(e).splitlines()[0])
+
+    def setup_daily_sales(self, conn, cursor):
+        """Create the daily_sales rollup and the triggers that keep it in step with products"""
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'products_daily_sales_ins')"
+        )
+        if cursor.fetchone()[0]:
+            return
         
-        products = []
-        for i in range(1, 51):
-            category = random.choice(categories)
-            status = random.choice(statuses)
-            amount = round(random.uniform(10, 1000), 2)
-            # distribute dates roughly across the last ~7 months
-            days_back = random.randint(0, 210)  # ~0..7 months
-            date_val = datetime.now() - timedelta(days=days_back)
-            rating = random.randint(1, 5)
-            
-            products.append((
-                f'Product {i}',
-                category,
-                status,
-                amount,
-                date_val.date(),
-                rating
-            ))
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS daily_sales (
+                day DATE NOT NULL,
+                status VARCHAR(50) NOT NULL,
+                total_amount DECIMAL(16, 2) NOT NULL DEFAULT 0,
+                product_count BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, status)
+            )
+        """)
         
-        cursor.executemany(insert_query, products)
+        # Statement-level triggers: each write statement is folded into the
+        # rollup as one grouped upsert. Keys are touched in (day, status)
+        # order so concurrent writers lock rollup rows in the same order.
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION products_daily_sales() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'TRUNCATE' THEN
+                    DELETE FROM daily_sales;
+                    RETURN NULL;
+                END IF;
+                
+                IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                    UPDATE daily_sales d
+                    SET total_amount = d.total_amount - o.total_amount,
+                        product_count = d.product_count - o.product_count
+                    FROM (
+                        SELECT date, status, SUM(amount) AS total_amount, COUNT(*) AS product_count
+                        FROM old_rows
+                        GROUP BY date, status
+                    ) o
+                    WHERE d.day = o.date AND d.status = o.status;
+                END IF;
+                
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO daily_sales (day, status, total_amount, product_count)
+                    SELECT date, status, SUM(amount), COUNT(*)
+                    FROM new_rows
+                    GROUP BY date, status
+                    ORDER BY date, status
+                    ON CONFLICT (day, status) DO UPDATE
+                    SET total_amount = daily_sales.total_amount + EXCLUDED.total_amount,
+                        product_count = daily_sales.product_count + EXCLUDED.product_count;
+                END IF;
+                
+                IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                    DELETE FROM daily_sales d
+                    USING (SELECT DISTINCT date, status FROM old_rows) o
+                    WHERE d.day = o.date AND d.status = o.status AND d.product_count = 0;
+                END IF;
+                
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        
+        cursor.execute('LOCK TABLE products IN SHARE ROW EXCLUSIVE MODE')
+        cursor.execute("""
+            CREATE TRIGGER products_daily_sales_ins AFTER INSERT ON products
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION products_daily_sales()
+        """)
+        cursor.execute("""
+            CREATE TRIGGER products_daily_sales_upd AFTER UPDATE ON products
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION products_daily_sales()
+        """)
+        cursor.execute("""
+            CREATE TRIGGER products_daily_sales_del AFTER DELETE ON products
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION products_daily_sales()
+        """)
+        cursor.execute("""
+            CREATE TRIGGER products_daily_sales_trunc AFTER TRUNCATE ON products
+            FOR EACH STATEMENT EXECUTE FUNCTION products_daily_sales()
+        """)
+        self._fill_daily_sales(cursor)
         conn.commit()
-        print(f'Inserted {len(products)} products')
+        logger.info('Daily sales rollup ready')
+
+    def _fill_daily_sales(self, cursor):
+        """Recompute daily_sales from products (caller holds a lock on products)"""
+        cursor.execute('DELETE FROM daily_sales')
+        cursor.execute("""
+            INSERT INTO daily_sales (day, status, total_amount, product_count)
+            SELECT date, status, SUM(amount), COUNT(*)
+            FROM products
+            GROUP BY date, status
+        """)
 
-    def get_products(self, limit, offset):
-        """Get products with pagination"""
+    @metrics.timed
+    def rebuild_daily_sales(self):
+        """Rebuild the daily_sales rollup from scratch (e.g. after manual edits)"""
         conn = None
         try:
             conn = self.get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor = conn.cursor()
             
-            cursor.execute(
-                'SELECT * FROM products ORDER BY id LIMIT %s OFFSET %s',
-                (limit, offset)
+            # Block writers (readers keep working) so the rollup can't drift
+            cursor.execute('LOCK TABLE products IN SHARE MODE')
+            self._fill_daily_sales(cursor)
+            cursor.execute('SELECT COUNT(*) FROM daily_sales')
+            rows = cursor.fetchone()[0]
+            # The rollup feeds the charts: a new data version makes the
+            # running servers drop their cached charts and ETags too
+            cursor.execute("UPDATE table_versions SET version = version + 1 WHERE table_name = 'products'")
+            conn.commit()
+            self._after_write()
+            
+            cursor.close()
+            return rows
+            
+        except Exception as e:
+            logger.error('Error rebuilding daily sales: %s', e)
+            if conn:
+                conn.rollback()
+            raise e
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    def maintain_partitions(self, first=None, last=None):
+        """Run the partition maintenance (see _maintain_partitions); None if products is not partitioned
+
+        Meant to run regularly (manage_partitions.py from cron) on top of
+        the run at startup. `first` / `last` also create the partitions of
+        those months, e.g. before a bulk load.
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT pg_advisory_lock(%s)', (self.SCHEMA_LOCK_ID,))
+            result = None
+            if self._products_kind(cursor) == 'p':
+                result = self._maintain_partitions(conn, cursor, first, last)
+                if result['created'] or result['detached'] or result['deleted']:
+                    self._after_write()
+            cursor.execute('SELECT pg_advisory_unlock(%s)', (self.SCHEMA_LOCK_ID,))
+            conn.commit()
+            
+            cursor.close()
+            return result
+            
+        except Exception as e:
+            logger.error('Error maintaining partitions: %s', e)
+            if conn:
+                conn.rollback()
+                # The advisory lock belongs to the session, not the transaction
+                conn.cursor().execute('SELECT pg_advisory_unlock_all()')
+                conn.commit()
+            raise e
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    def get_partitions(self):
+        """Attached partitions of products with their bounds and estimated rows ([] if not partitioned)"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), GREATEST(c.reltuples, 0)::BIGINT
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass('products')
+                ORDER BY c.relname
+            """)
+            partitions = [
+                {'name': name, 'bounds': bounds, 'rows': rows}
+                for name, bounds, rows in cursor.fetchall()
+            ]
+            
+            cursor.close()
+            return partitions
+            
+        except Exception as e:
+            logger.error('Error listing partitions: %s', e)
+            raise e
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    @metrics.timed
+    def migrate_to_partitioned(self):
+        """Convert a plain products table into the monthly partitioned layout.
+
+        Runs as one transaction holding an exclusive lock on products (the
+        app waits until it is done) and needs room for a second copy of
+        the table. Rows, ids and the id sequence are kept; the indexes,
+        triggers and rollups are rebuilt on the new table. Returns the
+        number of rows moved, or None if products is already partitioned.
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT pg_advisory_lock(%s)', (self.SCHEMA_LOCK_ID,))
+            if self._products_kind(cursor) != 'r':
+                cursor.execute('SELECT pg_advisory_unlock(%s)', (self.SCHEMA_LOCK_ID,))
+                conn.commit()
+                cursor.close()
+                return None
+            
+            cursor.execute('LOCK TABLE products IN ACCESS EXCLUSIVE MODE')
+            cursor.execute("SELECT pg_get_serial_sequence('products', 'id')")
+            sequence = cursor.fetchone()[0]
+            cursor.execute("""
+                SELECT conname FROM pg_constraint
+                WHERE conrelid = 'products'::regclass AND contype = 'p'
+            """)
+            pkey = cursor.fetchone()
+            
+            # The old table steps aside; its sequence outlives it
+            cursor.execute('ALTER TABLE products RENAME TO products_unpartitioned')
+            if pkey:
+                cursor.execute(f'ALTER TABLE products_unpartitioned RENAME CONSTRAINT {pkey[0]} TO products_unpartitioned_pkey')
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+            self._create_partitioned_products(cursor, sequence)
+            
+            # One partition per month with data, so nothing lands in the default partition
+            cursor.execute('SELECT MIN(date), MAX(date) FROM products_unpartitioned')
+            first, last = cursor.fetchone()
+            if first is not None:
+                for month in months(first, last):
+                    self._create_partition(cursor, month)
+            cursor.execute("""
+                INSERT INTO products (id, name, category, status, amount, date, rating, created_at)
+                SELECT id, name, category, status, amount, date, rating, created_at
+                FROM products_unpartitioned
+            """)
+            moved = cursor.rowcount
+            # Its triggers go with it; setup_* below install them on the new table
+            cursor.execute('DROP TABLE products_unpartitioned')
+            self._create_product_indexes(cursor)
+            conn.commit()
+            logger.info('Moved %d products into the partitioned table', moved)
+            
+            self.setup_row_counter(conn, cursor)
+            self.setup_table_version(conn, cursor)
+            self.setup_daily_sales(conn, cursor)
+            self.setup_search(conn, cursor)
+            self._maintain_partitions(conn, cursor)
+            
+            conn.autocommit = True
+            cursor.execute('ANALYZE products')
+            conn.autocommit = False
+            cursor.execute("UPDATE table_versions SET version = version + 1 WHERE table_name = 'products'")
+            cursor.execute('SELECT pg_advisory_unlock(%s)', (self.SCHEMA_LOCK_ID,))
+            conn.commit()
+            self._after_write()
+            
+            cursor.close()
+            return moved
+            
+        except Exception as e:
+            logger.error('Error migrating products to partitions: %s', e)
+            if conn:
+                conn.autocommit = False
+                conn.rollback()
+                conn.cursor().execute('SELECT pg_advisory_unlock_all()')
+                conn.commit()
+            raise e
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    @metrics.timed
+    @replica_read
+    def get_data_version(self):
+        """Get a token that changes whenever products (or the current date) change.
+
+        Shared by all processes because it is kept in table_versions; reading
+        it is a primary key lookup, so it is a cheap ETag source.
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            self._execute(conn, cursor, DATA_VERSION_SQL)
+            row = cursor.fetchone()
+            
+            cursor.close()
+            return data_version(row)
+            
+        except Exception as e:
+            logger.error('Error fetching data version: %s', e)
+            raise e
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    def seed_data(self, conn, cursor):
+        """Seed an empty database with generated sample data.
+
+        SEED_ROWS products (50) from product_generator with the fixed
+        SEED_RANDOM_SEED (42), so every fresh database gets the same rows.
+        Larger data sets are loaded with generate_products.py.
+        """
+        rows = int(os.getenv('SEED_ROWS', 50))
+        seed = int(os.getenv('SEED_RANDOM_SEED', DEFAULT_SEED))
+        inserted = self._copy_generated(conn, cursor, 0, rows, seed, None, DEFAULT_DAYS)
+        self._after_write()
+        logger.info('Inserted %d products', inserted)
+
+    def _copy_generated(self, conn, cursor, start, stop, seed, anchor, days):
+        """COPY generated rows start <= index < stop, one commit per chunk"""
+        lines = ((index, copy_line(values)) for index, values in generate_products(start, stop, seed, anchor, days))
+        inserted = 0
+        while True:
+            source = CopySource(lines, CHUNK_ROWS)
+            cursor.copy_expert(
+                'COPY products (name, category, status, amount, date, rating) FROM STDIN',
+                source
             )
+            conn.commit()
+            inserted += source.rows
+            if source.exhausted or inserted >= stop - start:
+                return inserted
+
+    @metrics.timed
+    def load_generated(self, start, stop, seed=DEFAULT_SEED, anchor=None, days=DEFAULT_DAYS):
+        """Load rows start <= index < stop of the generated data set (see product_generator)
+
+        Returns the number of rows inserted.
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            inserted = self._copy_generated(conn, cursor, start, stop, seed, anchor, days)
+            cursor.close()
+            if inserted:
+                self._after_write()
+            return inserted
+
+        except Exception as e:
+            logger.error('Error loading generated products: %s', e)
+            if conn:
+                conn.rollback()
+            raise e
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    @metrics.timed
+    @replica_read
+    def get_products(self, limit, offset, fmt=None, filters=None, sort=None):
+        """Get products with pagination
+
+        `fmt` is 'display' (default, as shown in the table) or 'raw'
+        (numeric amount, ISO date); see queries.PRODUCT_COLUMNS.
+        `filters` comes from queries.parse_product_filters and `sort` is a
+        field from queries.PRODUCT_SORTS, "-" prefixed for descending.
+        """
+        conn = None
+        try:
+            query = page_query(limit, offset, fmt, filters, sort)
+            conn = self.get_connection()
+            cursor = conn.cursor()
             
-            rows = cursor.fetchall()
+            # Formatted by PostgreSQL, plain tuples are the cheapest rows to build
+            self._execute(conn, cursor, *query)
             
-            # Format data for frontend
-            formatted = []
-            for row in rows:
-                formatted.append({
-                    'id': row['id'],
-                    'name': row['name'],
-                    'category': row['category'],
-                    'status': row['status'],
-                    'amount': f"${float(row['amount']):.2f}",
-                    'date': row['date'].strftime('%m/%d/%Y') if isinstance(row['date'], (datetime, date)) else str(row['date']),
-                    'rating': row['rating']
-                })
+            rows = cursor.fetchall()
             
             cursor.close()
-            return formatted
+            return product_dicts(rows)
             
         except Exception as e:
-            print(f'Error fetching products: {e}')
+            logger.error('Error fetching products: %s', e)
+            raise e
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    @metrics.timed
+    @replica_read
+    def get_products_by_cursor(self, limit, after=None, before=None, fmt=None, filters=None, sort=None):
+        """Get products with keyset (seek) pagination.
+
+        `after` / `before` are opaque cursors from a previous page of the
+        same sort. Rows are located through the (sort column, id) index
+        instead of OFFSET, so deep pages cost the same as the first one.
+        """
+        conn = None
+        try:
+            after_key = decode_cursor(after, sort) if after else None
+            before_key = decode_cursor(before, sort) if before else None
+
+            query = keyset_query(limit, after_key, before_key, fmt, filters, sort)
+
+            conn = self.get_connection()
+            cursor = conn.cursor()
+
+            # Fetch one extra row to know whether another page exists
+            self._execute(conn, cursor, *query)
+            rows = cursor.fetchall()
+
+            cursor.close()
+            return keyset_page(rows, limit, after_key, before_key, sort)
+
+        except Exception as e:
+            logger.error('Error fetching products: %s', e)
             raise e
         finally:
             if conn:
                 self.return_connection(conn)
 
+    def export_products(self, batch_size=2000):
+        """Yield all products as lists of raw tuples, `batch_size` rows at a time.
+
+        Uses a named (server-side) cursor, so only one batch is held in
+        memory. The pooled connection stays checked out until the generator
+        is exhausted or closed.
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor(name='products_export')
+            cursor.itersize = batch_size
+            cursor.execute("""
+                SELECT id, name, category, status, amount, date, rating
+                FROM products
+                ORDER BY id
+            """)
+
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+            cursor.close()
+
+        except Exception as e:
+            logger.error('Error exporting products: %s', e)
+            raise e
+        finally:
+            # Also runs when the client disconnects mid-stream (GeneratorExit).
+            # Read-only transaction; rollback drops the server-side cursor.
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+            self.return_connection(conn)
+
+    @metrics.timed
+    @replica_read
     def get_total_products(self):
         """Get total number of products"""
         conn = None
@@ -276,50 +1381,200 @@ class Database:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            cursor.execute('SELECT COUNT(*) as total FROM products')
+            self._execute(conn, cursor, COUNT_SQL)
             total = cursor.fetchone()[0]
             
             cursor.close()
             return total
             
         except Exception as e:
-            print(f'Error counting products: {e}')
+            logger.error('Error counting products: %s', e)
             raise e
         finally:
             if conn:
                 self.return_connection(conn)
 
-    def get_product_by_id(self, product_id):
-        """Get product by ID"""
+    @metrics.timed
+    @replica_read
+    def count_products(self, strategy=None, filters=None):
+        """Get total number of products using the configured count strategy.
+
+        Returns (total, exact) where `exact` tells whether the total is
+        precise or a planner estimate. With `filters` only matching
+        products are counted; the counter and reltuples know only the whole
+        table, so non-exact strategies use the planner's row estimate.
+        """
+        strategy = strategy or self.count_strategy
+        if strategy == 'exact' and not filters:
+            return self.get_total_products(), True
+        
         conn = None
         try:
             conn = self.get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor = conn.cursor()
             
-            cursor.execute('SELECT * FROM products WHERE id = %s', (product_id,))
+            if filters:
+                if strategy != 'exact':
+                    cursor.execute(*estimate_query(filters))
+                    estimate = plan_rows(cursor.fetchone()[0])
+                    if estimate >= self.count_exact_threshold:
+                        cursor.close()
+                        return estimate, False
+                cursor.execute(*count_query(filters))
+                total = cursor.fetchone()[0]
+                cursor.close()
+                return total, True
+            
+            if strategy == 'counter':
+                self._execute(conn, cursor, COUNTER_SQL)
+                row = cursor.fetchone()
+                if row is not None:
+                    cursor.close()
+                    return int(row[0]), True
+                # Counter not installed, fall through to the estimate
+            
+            self._execute(conn, cursor, ESTIMATE_SQL)
+            estimate = cursor.fetchone()[0]
+            
+            # Tables never analysed count as 0 rows; small tables
+            # are cheap to count exactly
+            if estimate < self.count_exact_threshold:
+                self._execute(conn, cursor, COUNT_SQL)
+                total = cursor.fetchone()[0]
+                cursor.close()
+                return total, True
+            
+            cursor.close()
+            return int(estimate), False
+            
+        except Exception as e:
+            logger.error('Error counting products: %s', e)
+            raise e
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    @metrics.timed
+    @replica_read
+    def get_product_by_id(self, product_id, with_version=False, fmt=None):
+        """Get product by ID
+
+        With `with_version=True` returns (product, row_version) where
+        row_version is the row's xmin, which changes on every update.
+        """
+        conn = None
+        try:
+            query = product_by_id_query(product_id, fmt)
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            self._execute(conn, cursor, *query)
             row = cursor.fetchone()
             
+            cursor.close()
             if not row:
-                return None
+                return (None, None) if with_version else None
+            
+            product = dict(zip(PRODUCT_KEYS, row))
+            if with_version:
+                return product, row[-1]
+            return product
+            
+        except Exception as e:
+            logger.error('Error fetching product: %s', e)
+            raise e
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    @metrics.timed
+    @replica_read
+    def get_product_version(self, product_id):
+        """Get only the row version (xmin) of a product, None if it doesn't exist"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT xmin::text FROM products WHERE id = %s', (product_id,))
+            row = cursor.fetchone()
             
             cursor.close()
-            return {
-                'id': row['id'],
-                'name': row['name'],
-                'category': row['category'],
-                'status': row['status'],
-                'amount': f"${float(row['amount']):.2f}",
-                'date': row['date'].strftime('%m/%d/%Y') if isinstance(row['date'], (datetime, date)) else str(row['date']),
-                'rating': row['rating']
-            }
+            return row[0] if row else None
             
         except Exception as e:
-            print(f'Error fetching product: {e}')
+            logger.error('Error fetching product: %s', e)
             raise e
         finally:
             if conn:
                 self.return_connection(conn)
 
+    @metrics.timed
+    @replica_read
+    def search_products(self, q, limit=None, fmt=None):
+        """Products whose name starts with or contains `q` (case-insensitive).
+
+        Returns {'data': [...], 'partial': bool}. Both queries share one
+        SEARCH_TIMEOUT_MS budget; if the substring query runs out of it the
+        prefix matches found so far are returned with partial=True.
+        """
+        q = (q or '').strip()
+        limit = max(1, min(limit or self.search_max_results, self.search_max_results))
+        if not q:
+            return {'data': [], 'partial': False}
+
+        # Keyed by the write version so a product created here is found at once
+        cache = self.search_cache
+        key = (q.lower(), limit, fmt, self.query_cache.version)
+        if cache.enabled:
+            found, value = cache.get(key)
+            if found:
+                return value
+        version = cache.version
+
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            started = time.monotonic()
+            budget = self.search_timeout_ms
+            prefix_rows, substring_rows, partial = [], [], False
+            try:
+                if budget > 0:
+                    cursor.execute("SELECT set_config('statement_timeout', %s, true)", (str(budget),))
+                cursor.execute(*search_prefix_query(q, limit, fmt))
+                prefix_rows = cursor.fetchall()
+                substring = None
+                if len(prefix_rows) < limit:
+                    substring = search_substring_query(q, limit - len(prefix_rows), fmt)
+                if substring and budget > 0:
+                    # The substring query only gets what the prefix query left
+                    remaining = budget - int((time.monotonic() - started) * 1000)
+                    if remaining > 0:
+                        cursor.execute("SELECT set_config('statement_timeout', %s, true)", (str(remaining),))
+                    else:
+                        substring, partial = None, True
+                if substring:
+                    cursor.execute(*substring)
+                    substring_rows = cursor.fetchall()
+            except psycopg2.extensions.QueryCanceledError:
+                partial = True
+            conn.rollback()
+            cursor.close()
+
+            result = {'data': search_result(prefix_rows, substring_rows, limit), 'partial': partial}
+            if cache.enabled and not partial:
+                cache.set(key, result, version)
+            return result
+
+        except Exception as e:
+            logger.error('Error searching products: %s', e)
+            raise e
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    @metrics.timed
     def create_product(self, name, category, status, amount, date, rating):
         """Create new product"""
         conn = None
@@ -334,6 +1589,7 @@ class Database:
             
             product_id = cursor.fetchone()[0]
             conn.commit()
+            self._after_write()
             
             cursor.close()
             return {
@@ -347,7 +1603,7 @@ class Database:
             }
             
         except Exception as e:
-            print(f'Error creating product: {e}')
+            logger.error('Error creating product: %s', e)
             if conn:
                 conn.rollback()
             raise e
@@ -355,15 +1611,17 @@ class Database:
             if conn:
                 self.return_connection(conn)
 
+    @metrics.timed
     def update_product(self, product_id, name, category, status, amount, date, rating):
         """Update product"""
         conn = None
         try:
             conn = self.get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor = conn.cursor()
             
             cursor.execute(
-                'UPDATE products SET name = %s, category = %s, status = %s, amount = %s, date = %s, rating = %s WHERE id = %s RETURNING *',
+                'UPDATE products SET name = %s, category = %s, status = %s, amount = %s, date = %s, rating = %s '
+                f'WHERE id = %s RETURNING {product_columns()}',
                 (name, category, status, float(amount), date, rating, product_id)
             )
             
@@ -373,20 +1631,13 @@ class Database:
             if not row:
                 cursor.close()
                 return None
+            self._after_write()
             
             cursor.close()
-            return {
-                'id': row['id'],
-                'name': row['name'],
-                'category': row['category'],
-                'status': row['status'],
-                'amount': f"${float(row['amount']):.2f}",
-                'date': row['date'].strftime('%m/%d/%Y') if isinstance(row['date'], (datetime, date)) else str(row['date']),
-                'rating': row['rating']
-            }
+            return dict(zip(PRODUCT_KEYS, row))
             
         except Exception as e:
-            print(f'Error updating product: {e}')
+            logger.error('Error updating product: %s', e)
             if conn:
                 conn.rollback()
             raise e
@@ -394,6 +1645,7 @@ class Database:
             if conn:
                 self.return_connection(conn)
 
+    @metrics.timed
     def delete_product(self, product_id):
         """Delete product"""
         conn = None
@@ -404,12 +1656,14 @@ class Database:
             cursor.execute('DELETE FROM products WHERE id = %s', (product_id,))
             deleted = cursor.rowcount > 0
             conn.commit()
+            if deleted:
+                self._after_write()
             
             cursor.close()
             return deleted
             
         except Exception as e:
-            print(f'Error deleting product: {e}')
+            logger.error('Error deleting product: %s', e)
             if conn:
                 conn.rollback()
             raise e
@@ -417,49 +1671,262 @@ class Database:
             if conn:
                 self.return_connection(conn)
 
-    def get_line_chart_data(self):
-        """Get line chart data (sales by day) - returns 10 Oct to 10 Nov with 3-day intervals"""
+    BATCH_OPERATIONS = ('create', 'update', 'delete')
+
+    @metrics.timed
+    def batch_products(self, operations, atomic=True):
+        """Apply a list of create / update / delete operations in one transaction.
+
+        Each operation is {'op': 'create', 'data': {...}},
+        {'op': 'update', 'id': 1, 'data': {...}} or {'op': 'delete', 'id': 1}.
+        Operations are grouped by type and executed as at most three
+        multi-row statements (creates, then updates, then deletes) with a
+        single commit. An id may appear only once per batch.
+
+        Returns {'committed': bool, 'results': [...]} with one result per
+        operation. With `atomic=True` any invalid operation rejects the whole
+        batch; otherwise invalid operations are skipped.
+        """
+        results = [None] * len(operations)
+        creates = []   # (index, values)
+        updates = []   # (index, id, values)
+        deletes = []   # (index, id)
+        seen_ids = set()
+
+        for index, operation in enumerate(operations):
+            op = operation.get('op') if isinstance(operation, dict) else None
+            try:
+                if op not in self.BATCH_OPERATIONS:
+                    raise ValueError(f'"op" must be one of: {", ".join(self.BATCH_OPERATIONS)}')
+                if op != 'create':
+                    product_id = operation.get('id')
+                    if isinstance(product_id, bool) or not isinstance(product_id, int):
+                        raise ValueError('"id" must be an integer')
+                    if product_id in seen_ids:
+                        raise ValueError(f'id {product_id} appears more than once in the batch')
+                    seen_ids.add(product_id)
+                if op == 'delete':
+                    deletes.append((index, product_id))
+                    continue
+                data = operation.get('data')
+                if not isinstance(data, dict):
+                    raise ValueError('"data" must be an object')
+                values = validate_product(data)
+                if op == 'create':
+                    creates.append((index, values))
+                else:
+                    updates.append((index, product_id, values))
+            except ValueError as e:
+                results[index] = {'index': index, 'op': op, 'status': 'invalid', 'error': str(e)}
+
+        invalid = any(result is not None for result in results)
+        if atomic and invalid:
+            return {'committed': False, 'results': [
+                result or {'index': index, 'op': operations[index]['op'], 'status': 'skipped'}
+                for index, result in enumerate(results)
+            ]}
+
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+            if creates:
+                # RETURNING order is not guaranteed: each row takes its id
+                # from the sequence up front (the CTE is volatile, so it is
+                # evaluated once) and comes back joined to its operation index
+                rows = execute_values(
+                    cursor,
+                    """
+                    WITH v AS (
+                        SELECT nextval(pg_get_serial_sequence('products', 'id'))::integer AS id, v.*
+                        FROM (VALUES %s) AS v (ord, name, category, status, amount, date, rating)
+                    ), inserted AS (
+                        INSERT INTO products (id, name, category, status, amount, date, rating)
+                        SELECT id, name, category, status, amount, date, rating FROM v
+                        RETURNING *
+                    )
+                    SELECT v.ord, inserted.* FROM inserted JOIN v ON v.id = inserted.id
+                    """,
+                    [(index,) + values for index, values in creates],
+                    template='(%s::integer, %s, %s, %s, %s::numeric, %s::date, %s::integer)',
+                    page_size=len(creates),
+                    fetch=True
+                )
+                for row in rows:
+                    index = row['ord']
+                    results[index] = {'index': index, 'op': 'create', 'status': 'created',
+                                      'id': row['id'], 'product': format_product(row)}
+
+            if updates:
+                rows = execute_values(
+                    cursor,
+                    """
+                    UPDATE products p
+                    SET name = v.name, category = v.category, status = v.status,
+                        amount = v.amount, date = v.date, rating = v.rating
+                    FROM (VALUES %s) AS v (id, name, category, status, amount, date, rating)
+                    WHERE p.id = v.id
+                    RETURNING p.*
+                    """,
+                    [(product_id,) + values for _, product_id, values in updates],
+                    template='(%s::integer, %s, %s, %s, %s::numeric, %s::date, %s::integer)',
+                    page_size=len(updates),
+                    fetch=True
+                )
+                updated = {row['id']: row for row in rows}
+                for index, product_id, _ in updates:
+                    row = updated.get(product_id)
+                    results[index] = (
+                        {'index': index, 'op': 'update', 'status': 'updated',
+                         'id': product_id, 'product': format_product(row)}
+                        if row else
+                        {'index': index, 'op': 'update', 'status': 'not_found', 'id': product_id}
+                    )
+
+            if deletes:
+                cursor.execute(
+                    'DELETE FROM products WHERE id = ANY(%s) RETURNING id',
+                    ([product_id for _, product_id in deletes],)
+                )
+                deleted = {row['id'] for row in cursor.fetchall()}
+                for index, product_id in deletes:
+                    results[index] = {'index': index, 'op': 'delete', 'id': product_id,
+                                      'status': 'deleted' if product_id in deleted else 'not_found'}
+
+            conn.commit()
+            cursor.close()
+            if creates or updates or deletes:
+                self._after_write()
+            return {'committed': True, 'results': results}
+
+        except Exception as e:
+            logger.error('Error applying batch: %s', e)
+            if conn:
+                conn.rollback()
+            raise e
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    @metrics.timed
+    def import_products(self, records, chunk_size=10000, max_errors=1000):
+        """Bulk-load products with COPY ... FROM STDIN.
+
+        `records` yields (line_number, record, error) as produced by
+        product_io.read_records. Rows are validated on the fly and streamed
+        straight into COPY, one COPY and commit per `chunk_size` rows, so
+        memory stays bounded and parsing overlaps with the server loading
+        the previous block. Invalid rows are skipped and reported (at most
+        `max_errors` of them are listed). Input that cannot be read any
+        further (bad encoding, broken CSV) ends the import with an error
+        entry; the rows before it are kept.
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1')
+        result = {'inserted': 0, 'failed': 0, 'errors': []}
+
+        def add_error(line, message, rows=1):
+            result['failed'] += rows
+            if len(result['errors']) < max_errors:
+                result['errors'].append({'line': line, 'error': message})
+
+        def valid_lines():
+            line_number = 0
+            iterator = iter(records)
+            while True:
+                try:
+                    line_number, record, error = next(iterator)
+                except StopIteration:
+                    return
+                except (csv.Error, ValueError, OSError) as e:
+                    # Undecodable bytes, a broken CSV quote, a read error:
+                    # the rest of the input is lost, the rows so far are
+                    # still loaded
+                    result['failed'] += 1
+                    result['errors'].append({'line': line_number + 1, 'error': f'Input could not be read: {e}'})
+                    return
+                if error:
+                    add_error(line_number, error)
+                    continue
+                try:
+                    values = validate_product(record)
+                except ValueError as e:
+                    add_error(line_number, str(e))
+                    continue
+                yield line_number, copy_line(values)
+
         conn = None
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
+
+            lines = valid_lines()
+            while True:
+                source = CopySource(lines, chunk_size)
+                try:
+                    cursor.copy_expert(
+                        'COPY products (name, category, status, amount, date, rating) FROM STDIN',
+                        source
+                    )
+                    conn.commit()
+                    result['inserted'] += source.rows
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    # The whole chunk is rejected together
+                    add_error(f'{source.first_line}-{source.last_line}', str(e).strip(), source.rows)
+                if source.exhausted:
+                    break
+
+            cursor.close()
+            return result
+
+        except Exception as e:
+            logger.error('Error importing products: %s', e)
+            if conn:
+                conn.rollback()
+            raise e
+        finally:
+            # Chunks committed before a failure are visible to everyone
+            if result['inserted']:
+                self._after_write()
+            if conn:
+                self.return_connection(conn)
+
+    @cached_query
+    @metrics.timed
+    @replica_read
+    def get_line_chart_data(self, date_from=None, date_to=None, bucket=None):
+        """Get line chart data (Completed sales per bucket)
+
+        Defaults to the last 31 days in 3-day buckets. `date_from` / `date_to`
+        are inclusive dates, `bucket` is 'day', 'week', 'month' or 'Nd'
+        (see parse_bucket). Each bucket sums every day it covers, read from
+        the daily_sales rollup with range predicates.
+        """
+        conn = None
+        try:
+            params, label_format = line_chart_query(date_from, date_to, bucket)
+
+            conn = self.get_connection()
+            cursor = conn.cursor()
             
-            cursor.execute("""
-                SELECT 
-                    to_char(m, 'YYYY-MM-DD') as day,
-                    COALESCE(SUM(p.amount), 0) as total
-                FROM generate_series(
-                    CURRENT_DATE - INTERVAL '31 days',
-                    CURRENT_DATE,
-                    INTERVAL '3 day'
-                ) AS m
-                LEFT JOIN products p
-                    ON DATE(p.date) = DATE(m)
-                    AND p.status = 'Completed'
-                GROUP BY m
-                ORDER BY m;
-            """)
-            
+            self._execute(conn, cursor, LINE_CHART_SQL, params)
             rows = cursor.fetchall()
             
-            labels = []
-            data = []
-            for row in rows:
-                day_str = row[0]  # 'YYYY-MM-DD'
-                date_obj = datetime.strptime(day_str, '%Y-%m-%d')
-                labels.append(date_obj.strftime('%d %b'))
-                data.append(float(row[1]))
-            
             cursor.close()
-            return {'labels': labels, 'data': data}
+            return line_chart_result(rows, label_format)
             
         except Exception as e:
-            print(f'Error fetching line chart data: {e}')
+            logger.error('Error fetching line chart data: %s', e)
             raise e
         finally:
             if conn:
                 self.return_connection(conn)
 
+    @cached_query
+    @metrics.timed
+    @replica_read
     def get_bar_chart_data(self):
         """Get bar chart data (inventory by category)"""
         conn = None
@@ -467,35 +1934,22 @@ class Database:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            cursor.execute("""
-                SELECT 
-                    category,
-                    COUNT(*) as count
-                FROM products
-                GROUP BY category
-                ORDER BY count DESC
-            """)
-            
+            self._execute(conn, cursor, BAR_CHART_SQL)
             rows = cursor.fetchall()
             
-            labels = [row[0] for row in rows]
-            data = [int(row[1]) for row in rows]
-            
-            # If no data, return empty arrays
-            if not labels:
-                labels = []
-                data = []
-            
             cursor.close()
-            return {'labels': labels, 'data': data}
+            return count_chart_result(rows)
             
         except Exception as e:
-            print(f'Error fetching bar chart data: {e}')
+            logger.error('Error fetching bar chart data: %s', e)
             raise e
         finally:
             if conn:
                 self.return_connection(conn)
 
+    @cached_query
+    @metrics.timed
+    @replica_read
     def get_pie_chart_data(self):
         """Get pie chart data (status distribution)"""
         conn = None
@@ -503,37 +1957,129 @@ class Database:
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            cursor.execute("""
-                SELECT 
-                    status,
-                    COUNT(*) as count
-                FROM products
-                GROUP BY status
-            """)
-            
+            self._execute(conn, cursor, PIE_CHART_SQL)
             rows = cursor.fetchall()
             
-            labels = [row[0] for row in rows]
-            data = [int(row[1]) for row in rows]
-            
-            # If no data, return empty arrays
-            if not labels:
-                labels = []
-                data = []
-            
             cursor.close()
-            return {'labels': labels, 'data': data}
+            return count_chart_result(rows)
             
         except Exception as e:
-            print(f'Error fetching pie chart data: {e}')
+            logger.error('Error fetching pie chart data: %s', e)
             raise e
         finally:
             if conn:
                 self.return_connection(conn)
 
+    @cached_query
+    @metrics.timed
+    @replica_read
+    def get_dashboard_data(self):
+        """Get line, bar and pie chart data with a single scan of products.
+
+        GROUPING SETS computes the per-category counts, per-status counts and
+        per-day Completed sales in one pass; the result matches
+        get_line_chart_data / get_bar_chart_data / get_pie_chart_data.
+        """
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+
+            self._execute(conn, cursor, DASHBOARD_SQL)
+            rows = cursor.fetchall()
+            cursor.close()
+
+            return dashboard_result(rows)
+
+        except Exception as e:
+            logger.error('Error fetching dashboard data: %s', e)
+            raise e
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    def chart_snapshot(self, name, *args):
+        """Latest Snapshot of chart method `name`(*args), stale-while-revalidate (see snapshots.py)
+
+        Only the first call for a key waits for the query; later ones get
+        the snapshot as it is while the refresher thread updates it.
+        """
+        if not self.snapshots.enabled:
+            version = self.get_data_version()
+            return Snapshot(getattr(self, name)(*args), version)
+        if self._refresher is None:
+            self._start_refresher()
+        snapshot = self.snapshots.get((name, args))
+        if snapshot is None:
+            snapshot = self._compute_snapshot((name, args))
+        return snapshot
+
+    def _compute_snapshot(self, key, refresh=False):
+        """Compute and store the snapshot for `key`; callers arriving meanwhile share the result"""
+        with self._snapshot_lock:
+            future = self._snapshot_inflight.get(key)
+            running = future is not None
+            if not running:
+                future = self._snapshot_inflight[key] = Future()
+        if running:
+            return future.result()
+        
+        try:
+            # Both reads on one server, version first: a write landing
+            # during the query makes the snapshot look older than it is,
+            # never newer
+            name, args = key
+            with holding_replica():
+                version = self.get_data_version()
+                value = getattr(self, name)(*args)
+            snapshot = Snapshot(value, version)
+            self.snapshots.put(key, snapshot, refresh)
+            future.set_result(snapshot)
+            return snapshot
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._snapshot_lock:
+                del self._snapshot_inflight[key]
+
+    def refresh_snapshots(self):
+        """Recompute the snapshots that are out of date, one at a time; returns how many"""
+        version = self.get_data_version()
+        refreshed = 0
+        for key in self.snapshots.due(version):
+            try:
+                self._compute_snapshot(key, refresh=True)
+                refreshed += 1
+            except Exception as e:
+                # Requests keep getting the previous snapshot
+                self.snapshots.failures += 1
+                logger.warning('Chart snapshot %s%s not refreshed: %s', key[0], key[1], e)
+        return refreshed
+
+    def _start_refresher(self):
+        with self._snapshot_lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_loop, name='chart-refresher', daemon=True)
+                self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            # Woken early by writes in this process (_after_write)
+            self._snapshot_wake.wait(self.snapshots.interval)
+            self._snapshot_wake.clear()
+            try:
+                self.refresh_snapshots()
+            except Exception as e:
+                logger.warning('Chart snapshot refresh failed: %s', e)
+
     def close(self):
-        """Close all connections in the pool"""
+        """Close all connections in the pool (a later query opens a new pool)"""
         if self.connection_pool:
             self.connection_pool.closeall()
-            print('Database connection pool closed')
+            self.connection_pool = None
+            for replica in self.replica_set.replicas:
+                replica.connection_pool.closeall()
+            self.replica_set = ReplicaSet()
+            logger.info('Database connection pool closed')
 
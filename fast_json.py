@@ -0,0 +1,58 @@
+"""
+Optional orjson-backed JSON provider for the Flask and Quart apps.
+
+orjson encodes large product pages several times faster than the standard
+json module. It is optional: without it (or with JSON_ENCODER=std) the
+frameworks' default provider is used. Output matches the default provider:
+keys are sorted, dates and Decimals go through the framework's `default`.
+
+    JSON_ENCODER=auto    orjson when installed (default)
+    JSON_ENCODER=orjson  require orjson
+    JSON_ENCODER=std     standard json module
+"""
+
+import logging
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+ORJSON_OPTIONS = (
+    orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    if orjson else 0
+)
+
+
+def use_fast_json():
+    """Whether JSON_ENCODER selects orjson (raises RuntimeError if it is required but missing)"""
+    mode = os.getenv('JSON_ENCODER', 'auto').strip().lower()
+    if mode == 'std':
+        return False
+    if mode == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_ENCODER=orjson but orjson is not installed (pip install orjson)')
+    return orjson is not None
+
+
+def orjson_provider(base):
+    """Subclass a Flask / Quart DefaultJSONProvider to encode with orjson"""
+
+    class OrjsonProvider(base):
+        def dumps(self, obj, **kwargs):
+            # indent / separators from debug pretty-printing are ignored
+            return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS).decode('utf-8')
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    return OrjsonProvider
+
+
+def install(app, base):
+    """Switch `app` to orjson when JSON_ENCODER allows it"""
+    if use_fast_json():
+        app.json = orjson_provider(base)(app)
+        logger.info('JSON encoder: orjson')
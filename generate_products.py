@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Скрипт для генерации синтетических продуктов (до десятков миллионов строк)
+
+Данные детерминированы: одинаковые --seed и --anchor-date дают одинаковые
+строки при любом числе процессов. Без --reset таблица дополняется до
+нужного числа строк (продолжение того же набора данных).
+
+Примеры:
+    python generate_products.py 1m
+    python generate_products.py 10m --workers 4 --reset
+    python generate_products.py 200k --seed 7 --anchor-date 2025-12-31
+"""
+
+import argparse
+import logging
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from dotenv import load_dotenv
+from database import Database
+from product_generator import DEFAULT_DAYS, DEFAULT_SEED, chunk_ranges
+
+SUFFIXES = {'k': 1000, 'm': 1000000}
+
+
+def parse_rows(value):
+    """"200000", "200k", "10m" -> int"""
+    text = value.strip().lower().replace('_', '')
+    try:
+        if text and text[-1] in SUFFIXES:
+            rows = int(float(text[:-1]) * SUFFIXES[text[-1]])
+        else:
+            rows = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid row count: {value}')
+    if rows < 0:
+        raise argparse.ArgumentTypeError(f'invalid row count: {value}')
+    return rows
+
+
+def _load_ranges(ranges, seed, anchor, days):
+    # Runs in a worker process: its own pool, tables already exist
+    db = Database()
+    db.tables_ready = True
+    db.connect()
+    try:
+        return sum(db.load_generated(start, stop, seed, anchor, days) for start, stop in ranges)
+    finally:
+        db.close()
+
+
+def load(db, rows, seed=DEFAULT_SEED, anchor=None, days=DEFAULT_DAYS, workers=1, reset=False):
+    """Bring products to `rows` generated rows; returns the number inserted.
+
+    The rows already in the table are taken as the first rows of the data
+    set, so a second run only appends the missing ones.
+    """
+    anchor = anchor or date.today()
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        if reset:
+            cursor.execute('TRUNCATE products RESTART IDENTITY')
+            conn.commit()
+        cursor.execute('SELECT COUNT(*) FROM products')
+        existing = cursor.fetchone()[0]
+        cursor.close()
+    finally:
+        db.return_connection(conn)
+
+    if existing >= rows:
+        return 0
+
+    # A partitioned products gets its monthly partitions before the load
+    db.maintain_partitions(anchor - timedelta(days=days - 1), anchor)
+
+    ranges = chunk_ranges(existing, rows)
+    workers = max(1, min(workers, len(ranges)))
+    if workers == 1:
+        inserted = sum(db.load_generated(start, stop, seed, anchor, days) for start, stop in ranges)
+    else:
+        # spawn: the children must not inherit the parent's pool sockets
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            # Round-robin so every worker gets a similar share of chunks
+            futures = [
+                executor.submit(_load_ranges, ranges[i::workers], seed, anchor, days)
+                for i in range(workers)
+            ]
+            inserted = sum(future.result() for future in futures)
+
+    conn = db.get_connection()
+    try:
+        # Fresh statistics for the planner after a bulk load
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute('ANALYZE products')
+        cursor.close()
+    finally:
+        conn.autocommit = False
+        db.return_connection(conn)
+    db.query_cache.bump_version()
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate deterministic synthetic products and load them via COPY')
+    parser.add_argument('rows', type=parse_rows, help='target number of rows in products, e.g. 200000, 200k, 10m')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='random seed of the data set')
+    parser.add_argument('--workers', type=int, default=1, help='parallel loader processes')
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='dates span this many days back')
+    parser.add_argument('--anchor-date', type=date.fromisoformat, help='latest date, YYYY-MM-DD (default: today)')
+    parser.add_argument('--reset', action='store_true', help='empty the table first (TRUNCATE ... RESTART IDENTITY)')
+    args = parser.parse_args()
+
+    if args.days < 1:
+        parser.error('--days must be at least 1')
+
+    # Load environment variables
+    load_dotenv()
+    # Database messages go to the console as plain lines
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    db = Database()
+    db.init()
+
+    try:
+        started = time.perf_counter()
+        inserted = load(
+            db, args.rows, seed=args.seed, anchor=args.anchor_date, days=args.days,
+            workers=args.workers, reset=args.reset
+        )
+        elapsed = time.perf_counter() - started
+
+        rate = inserted / elapsed if elapsed > 0 else 0
+        print(f"Добавлено: {inserted} строк за {elapsed:.2f} с ({rate:,.0f} строк/с)")
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Gunicorn settings for the production (multi-process) mode.
+
+gunicorn picks this file up automatically when started from the project
+directory:
+    gunicorn app:app
+or through `SERVER_MODE=production python app.py`.
+
+Tables are created once in the master before any worker is forked; the
+master then closes its pool, and each worker opens its own pool on its
+first request (see Database.get_connection), so no socket is ever shared
+across a fork.
+
+Environment:
+    PORT                 listen port (3000)
+    WEB_WORKERS          worker processes (number of CPUs)
+    WEB_THREADS          threads per worker (4)
+    WEB_TIMEOUT          seconds before a stuck worker is restarted (30)
+    WEB_MAX_REQUESTS     restart a worker after this many requests (0 = never)
+    DB_POOL_MAX          connections per worker (WEB_THREADS)
+    DB_POOL_MAX_TOTAL    connection budget for all workers; DB_POOL_MAX
+                         defaults to DB_POOL_MAX_TOTAL // WEB_WORKERS
+    METRICS_DIR          where workers publish metric snapshots for
+                         /metrics (a fresh temporary directory)
+"""
+
+import glob
+import multiprocessing
+import os
+import shutil
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = f"0.0.0.0:{os.getenv('PORT', 3000)}"
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 4))
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+# No gunicorn access log: the app writes sampled, structured access
+# records itself (LOG_SAMPLE, see log_config.py)
+
+# Pool size per worker: a worker never runs more than `threads` queries at
+# once, so more connections would only sit idle. Set before the workers
+# fork so they inherit it.
+if 'DB_POOL_MAX' not in os.environ:
+    total = os.getenv('DB_POOL_MAX_TOTAL')
+    per_worker = max(1, int(total) // workers) if total else threads
+    os.environ['DB_POOL_MAX'] = str(per_worker)
+
+# Each worker counts its own requests; /metrics adds up the snapshots the
+# workers write here (see metrics.py)
+own_metrics_dir = not os.getenv('METRICS_DIR')
+if own_metrics_dir:
+    os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='dataviz-metrics-')
+
+
+def on_starting(server):
+    """Create tables and seed data once, in the master"""
+    # Snapshots of a previous run would be counted as live workers
+    for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.json')):
+        os.remove(path)
+    from app import db
+    db.init()
+    db.close()
+
+
+def when_ready(server):
+    pool_max = int(os.environ['DB_POOL_MAX'])
+    server.log.info(f'{workers} workers x {threads} threads, up to {workers * pool_max} database connections')
+
+
+def child_exit(server, worker):
+    """Stop counting an exited worker in /metrics"""
+    import metrics
+    metrics.remove_snapshot(worker.pid)
+
+
+def on_exit(server):
+    if own_metrics_dir:
+        shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Скрипт для массовой загрузки продуктов из CSV или NDJSON через COPY
+
+Примеры:
+    python import_products.py products.csv
+    python import_products.py products.ndjson --chunk-size 50000
+    cat products.csv | python import_products.py - --format csv
+"""
+
+import argparse
+import io
+import logging
+import sys
+import time
+from dotenv import load_dotenv
+from database import Database
+from product_io import FORMATS, detect_format, read_records
+
+
+def positive_int(value):
+    """argparse type: integer >= 1"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid integer: {value}')
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'must be at least 1: {value}')
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import products (CSV / NDJSON) via COPY')
+    parser.add_argument('path', help='file to import, "-" for stdin')
+    parser.add_argument('--format', choices=FORMATS, help='input format (default: by file extension)')
+    parser.add_argument('--chunk-size', type=positive_int, default=10000, help='rows per COPY / commit')
+    parser.add_argument('--show-errors', type=int, default=20, help='how many row errors to print')
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(filename=args.path)
+    if fmt is None:
+        parser.error('cannot detect format, pass --format')
+
+    # Load environment variables
+    load_dotenv()
+    # Database messages go to the console as plain lines
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    db = Database()
+    db.init()
+
+    try:
+        if args.path == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+        else:
+            stream = open(args.path, encoding='utf-8-sig', newline='')
+
+        started = time.perf_counter()
+        with stream:
+            result = db.import_products(read_records(stream, fmt), chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - started
+
+        rate = result['inserted'] / elapsed if elapsed > 0 else 0
+        print(f"Загружено: {result['inserted']} строк за {elapsed:.2f} с ({rate:,.0f} строк/с)")
+        if result['failed']:
+            print(f"Ошибок: {result['failed']}")
+            for error in result['errors'][:args.show_errors]:
+                print(f"  строка {error['line']}: {error['error']}")
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
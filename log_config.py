@@ -0,0 +1,194 @@
+"""
+Non-blocking structured logging for the Flask and Quart apps.
+
+Code on the request path only puts records on an in-memory queue; a
+background thread (logging.handlers.QueueListener) formats them and
+writes them to stdout, so a slow terminal or log collector never stalls a
+request. Each request gets one access record (route, status, duration),
+sampled per route so hot endpoints can log a fraction of their traffic.
+Errors and 5xx responses are always logged.
+
+Environment:
+    LOG_LEVEL       root level (INFO)
+    LOG_LEVELS      per-logger levels, e.g. "database=WARNING,access=INFO"
+    LOG_FORMAT      json (default) or text
+    LOG_SAMPLE      share of requests written to the access log, by route
+                    pattern (fnmatch, first match wins; default 1), e.g.
+                    "/api/charts/*=0.01,/api/products=0.1"
+    LOG_QUEUE_SIZE  queued records before new ones are dropped (10000)
+"""
+
+import atexit
+import copy
+import fnmatch
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+access_logger = logging.getLogger('access')
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_handler = None
+_listener = None
+_sample_rules = []
+_sample_cache = {}
+
+
+def record_fields(record):
+    """Fields passed to a log call through `extra`"""
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS and not k.startswith('_')}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, extra fields, exc"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable line with extra fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        fields = record_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f'{k}={v}' for k, v in fields.items())
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Only merge the args here; the traceback is rendered by the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in (spec or '').split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _parse_sample(spec):
+    rules = []
+    for item in (spec or '').split(','):
+        pattern, sep, rate = item.rpartition('=')
+        if not sep or not pattern.strip():
+            continue
+        try:
+            rules.append((pattern.strip(), min(max(float(rate), 0.0), 1.0)))
+        except ValueError:
+            continue
+    return rules
+
+
+def _start_listener():
+    global _listener
+    stream = logging.StreamHandler(sys.stdout)
+    if os.getenv('LOG_FORMAT', 'json').strip().lower() == 'text':
+        stream.setFormatter(TextFormatter())
+    else:
+        stream.setFormatter(JsonFormatter())
+    _handler.queue = queue.Queue(int(os.getenv('LOG_QUEUE_SIZE', 10000)))
+    _listener = logging.handlers.QueueListener(_handler.queue, stream, respect_handler_level=False)
+    _listener.start()
+
+
+def _after_fork():
+    # The listener thread does not survive fork(); each worker starts its own
+    if _handler is not None:
+        _start_listener()
+
+
+def _stop():
+    if _listener is not None:
+        _listener.stop()
+
+
+def setup_logging():
+    """Route all logging through the queue (idempotent)"""
+    global _handler, _sample_rules
+    if _handler is not None:
+        return
+    _handler = DroppingQueueHandler(None)
+    _start_listener()
+
+    root = logging.getLogger()
+    root.handlers[:] = [_handler]
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').strip().upper())
+    for name, level in _parse_levels(os.getenv('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level)
+    _sample_rules = _parse_sample(os.getenv('LOG_SAMPLE'))
+
+    atexit.register(_stop)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_after_fork)
+
+
+def sample_rate(route):
+    """Configured LOG_SAMPLE share for a route (1.0 when no rule matches)"""
+    rate = _sample_cache.get(route)
+    if rate is None:
+        rate = next((r for pattern, r in _sample_rules if fnmatch.fnmatchcase(route, pattern)), 1.0)
+        _sample_cache[route] = rate
+    return rate
+
+
+def log_request(route, method, path, status, duration):
+    """Access record for one request; sampled per route, 5xx always written"""
+    if not access_logger.isEnabledFor(logging.INFO):
+        return
+    # Not the raw path: unmatched requests (scanners) would grow
+    # _sample_cache without bound
+    route = route or '<unmatched>'
+    rate = sample_rate(route)
+    if status < 500 and rate < 1.0 and random.random() >= rate:
+        return
+    access_logger.info(
+        '%s %s %s', method, path, status,
+        extra={'route': route, 'status': status, 'duration_ms': round(duration * 1000, 2), 'sample_rate': rate}
+    )
+
+
+def dropped_records():
+    """Records dropped because the queue was full (this process)"""
+    return _handler.dropped if _handler is not None else 0
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Скрипт для обслуживания помесячных партиций таблицы products
+(PRODUCTS_PARTITIONING=monthly)
+
+Без аргументов создаёт недостающие партиции (текущий месяц и
+PRODUCTS_PARTITIONS_AHEAD месяцев вперёд) и отключает партиции старше
+PRODUCTS_PARTITION_RETENTION_MONTHS. Удобно запускать раз в день из cron.
+
+Примеры:
+    python manage_partitions.py
+    python manage_partitions.py --migrate
+    python manage_partitions.py --list
+"""
+
+import argparse
+import logging
+import sys
+from dotenv import load_dotenv
+from database import Database
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the monthly partitions of products')
+    parser.add_argument('--migrate', action='store_true', help='convert a plain products table to partitions first')
+    parser.add_argument('--list', action='store_true', help='only print the attached partitions')
+    args = parser.parse_args()
+
+    # Load environment variables
+    load_dotenv()
+    # Database messages go to the console as plain lines
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    db = Database()
+    db.init()
+
+    try:
+        if args.migrate:
+            moved = db.migrate_to_partitioned()
+            if moved is None:
+                print("Таблица products уже разбита на партиции")
+            else:
+                print(f"Таблица products разбита на партиции: перенесено {moved} строк")
+        elif not args.list:
+            result = db.maintain_partitions()
+            if result is None:
+                print("Таблица products не разбита на партиции (см. --migrate)")
+                sys.exit(1)
+            action = 'удалено' if db.partition_drop else 'отключено'
+            print(
+                f"Создано партиций: {len(result['created'])}, {action}: {len(result['detached'])}, "
+                f"удалено устаревших строк: {result['deleted']}"
+            )
+
+        for partition in db.get_partitions():
+            print(f"{partition['name']:<20} {partition['bounds']:<60} ~{partition['rows']} строк")
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
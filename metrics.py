@@ -0,0 +1,258 @@
+"""
+Prometheus-style metrics for the Flask and Quart apps (no extra dependency).
+
+- http_request_duration_seconds{route, method, status}: request latency
+- db_query_duration_seconds{method}: time spent in each Database method
+  (cache hits of the chart methods are not counted)
+- db_pool_wait_seconds: time to check a connection out of the pool
+- gauges / counters read at scrape time through register_callback()
+  (pool connections in use, cache hits, dropped log records)
+
+Recording is a bisect and a few additions under a lock. GET /metrics
+renders everything in the text exposition format.
+
+gunicorn runs several workers, each with its own counters. With
+METRICS_DIR set (gunicorn.conf.py sets it), every worker writes a snapshot
+there every METRICS_FLUSH_INTERVAL seconds (5) and /metrics adds up the
+snapshots of all live workers, whichever worker serves the scrape.
+"""
+
+import bisect
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+INF_LABEL = 'le="+Inf"'
+
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+
+_histograms = {}
+_callbacks = {}
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}        # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        """{label values: [non-cumulative bucket counts..., sum, count]}"""
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+def histogram(name, help, labels=(), buckets=LATENCY_BUCKETS):
+    """Create (or return the existing) histogram `name`"""
+    if name not in _histograms:
+        _histograms[name] = Histogram(name, help, labels, buckets)
+    return _histograms[name]
+
+
+def register_callback(name, help, kind, labels, collect):
+    """Gauge or counter read at scrape time: collect() returns {label values tuple: number}"""
+    _callbacks[name] = (help, kind, tuple(labels), collect)
+
+
+def cache_counters(caches):
+    """Collector for register_callback: hit / miss counters of named QueryCaches"""
+    def collect():
+        values = {}
+        for name, cache in caches.items():
+            values[(name, 'hit')] = cache.hits
+            values[(name, 'miss')] = cache.misses
+        return values
+    return collect
+
+
+REQUEST_DURATION = histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ('route', 'method', 'status')
+)
+QUERY_DURATION = histogram(
+    'db_query_duration_seconds', 'Time spent in Database methods', ('method',), QUERY_BUCKETS
+)
+POOL_WAIT = histogram(
+    'db_pool_wait_seconds', 'Time to check a connection out of the pool', (), WAIT_BUCKETS
+)
+
+
+def observe_request(route, method, status, duration):
+    REQUEST_DURATION.observe(duration, route or '<unmatched>', method, str(status))
+
+
+def timed(method):
+    """Record the duration of a (sync or async) Database method in db_query_duration_seconds"""
+    name = method.__name__
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                QUERY_DURATION.observe(time.perf_counter() - started, name)
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            QUERY_DURATION.observe(time.perf_counter() - started, name)
+    return wrapper
+
+
+def _collect():
+    """This process's state in the snapshot format"""
+    values = {}
+    for name, (_help, _kind, _labels, collect) in _callbacks.items():
+        try:
+            values[name] = {json.dumps(list(k)): v for k, v in collect().items()}
+        except Exception:
+            values[name] = {}
+    return {
+        'histograms': {
+            name: {json.dumps(list(k)): v for k, v in h.snapshot().items()}
+            for name, h in _histograms.items()
+        },
+        'values': values
+    }
+
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f'{pid}.json')
+
+
+def write_snapshot():
+    """Write this process's snapshot to METRICS_DIR (atomically)"""
+    path = _snapshot_path(os.getpid())
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(_collect(), f)
+    os.replace(tmp, path)
+
+
+def remove_snapshot(pid):
+    """Forget a worker that exited (gunicorn child_exit)"""
+    if METRICS_DIR:
+        try:
+            os.remove(_snapshot_path(pid))
+        except OSError:
+            pass
+
+
+def _merge(total, snapshot):
+    for name, series in snapshot.get('histograms', {}).items():
+        merged = total['histograms'].setdefault(name, {})
+        for key, values in series.items():
+            if key in merged:
+                merged[key] = [a + b for a, b in zip(merged[key], values)]
+            else:
+                merged[key] = list(values)
+    for name, series in snapshot.get('values', {}).items():
+        merged = total['values'].setdefault(name, {})
+        for key, value in series.items():
+            merged[key] = merged.get(key, 0) + value
+
+
+def _all_processes():
+    """Own live state plus the snapshots of the other workers"""
+    total = {'histograms': {}, 'values': {}}
+    _merge(total, _collect())
+    if METRICS_DIR and os.path.isdir(METRICS_DIR):
+        own = f'{os.getpid()}.json'
+        for name in os.listdir(METRICS_DIR):
+            if not name.endswith('.json') or name == own:
+                continue
+            try:
+                with open(os.path.join(METRICS_DIR, name)) as f:
+                    _merge(total, json.load(f))
+            except (OSError, ValueError):
+                continue
+    return total
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    state = _all_processes()
+    lines = []
+    for name, h in _histograms.items():
+        lines.append(f'# HELP {name} {h.help}')
+        lines.append(f'# TYPE {name} histogram')
+        for key, series in sorted(state['histograms'].get(name, {}).items()):
+            values = json.loads(key)
+            cumulative = 0
+            for bound, count in zip(h.buckets, series):
+                cumulative += count
+                le = f'le="{_format_number(float(bound))}"'
+                lines.append(f'{name}_bucket{_labels(h.labels, values, [le])} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(h.labels, values, [INF_LABEL])} {series[-1]}')
+            lines.append(f'{name}_sum{_labels(h.labels, values)} {_format_number(series[-2])}')
+            lines.append(f'{name}_count{_labels(h.labels, values)} {series[-1]}')
+    for name, (help, kind, labels, _collect_fn) in _callbacks.items():
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for key, value in sorted(state['values'].get(name, {}).items()):
+            lines.append(f'{name}{_labels(labels, json.loads(key))} {_format_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            write_snapshot()
+        except OSError:
+            pass
+
+
+def _after_fork():
+    # A forked worker starts from zero (the master only ran the schema
+    # setup) and publishes its own snapshot
+    for h in _histograms.values():
+        h.reset()
+    if METRICS_DIR:
+        threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,51 @@
+"""
+Month arithmetic and naming for the range-partitioned products table
+(PRODUCTS_PARTITIONING=monthly, see Database.create_tables).
+
+Each partition holds one calendar month of `date` and is named
+products_pYYYYMM; products_default takes the rows no partition covers
+(dates too far in the future, or months not created yet). Partitions are
+recognised by name only, so tables attached by hand under other names
+are left alone by the maintenance.
+"""
+
+import re
+from datetime import date
+
+PARTITION_PREFIX = 'products_p'
+DEFAULT_PARTITION = 'products_default'
+
+_NAME_RE = re.compile(r'^products_p(\d{4})(\d{2})$')
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(month, count):
+    """First day of the month `count` months after (or before) `month`"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months(first, last):
+    """First days of the months from `first` to `last`, both included"""
+    result = []
+    month = month_start(first)
+    while month <= last:
+        result.append(month)
+        month = add_months(month, 1)
+    return result
+
+
+def partition_name(month):
+    return f'{PARTITION_PREFIX}{month:%Y%m}'
+
+
+def partition_month(name):
+    """First day of the month held by partition `name`, None for other tables"""
+    match = _NAME_RE.match(name)
+    if not match:
+        return None
+    year, month = int(match.group(1)), int(match.group(2))
+    return date(year, month, 1) if 1 <= month <= 12 else None
@@ -0,0 +1,138 @@
+"""
+Deterministic synthetic products with skewed, realistic distributions.
+
+Row i of a data set depends only on (seed, i, anchor date): rows are made
+in fixed chunks of CHUNK_ROWS, each with its own RNG, so any range can be
+generated independently (by several processes, or to top up an existing
+table) and the result is the same as generating everything at once.
+
+Distributions:
+- category: a few big categories, a long tail (CATEGORY_WEIGHTS)
+- date: over the `days` before the anchor date, more rows in recent
+  days and on weekends
+- status: mostly Completed; recent orders are more often Pending
+- amount: log-normal per category (books are cheap, electronics are not)
+- rating: skewed towards 4 and 5
+"""
+
+import bisect
+import math
+import random
+from datetime import date, timedelta
+from itertools import accumulate
+
+CHUNK_ROWS = 100000
+
+DEFAULT_SEED = 42
+DEFAULT_DAYS = 730
+
+CATEGORY_WEIGHTS = {
+    'Electronics': 35,
+    'Clothing': 25,
+    'Food': 20,
+    'Furniture': 12,
+    'Books': 8,
+}
+
+# (median amount, sigma of the log) per category
+AMOUNT_PARAMS = {
+    'Electronics': (350.0, 0.8),
+    'Clothing': (55.0, 0.6),
+    'Food': (18.0, 0.6),
+    'Furniture': (280.0, 0.7),
+    'Books': (22.0, 0.5),
+}
+
+NAME_PARTS = {
+    'Electronics': (('Nova', 'Volt', 'Pixel', 'Orion', 'Zen'), ('Laptop', 'Phone', 'Headphones', 'Monitor', 'Camera', 'Tablet')),
+    'Clothing': (('Urban', 'Alpine', 'Coastal', 'Classic', 'Metro'), ('Jacket', 'Shirt', 'Jeans', 'Sneakers', 'Dress', 'Hoodie')),
+    'Food': (('Farm', 'Golden', 'Fresh', 'Harvest', 'Royal'), ('Coffee', 'Tea', 'Honey', 'Pasta', 'Chocolate', 'Olive Oil')),
+    'Furniture': (('Oak', 'Nordic', 'Loft', 'Cozy', 'Studio'), ('Chair', 'Table', 'Sofa', 'Shelf', 'Desk', 'Lamp')),
+    'Books': (('Silent', 'Lost', 'Hidden', 'Last', 'Bright'), ('Garden', 'River', 'Empire', 'Journey', 'Code', 'Letters')),
+}
+
+STATUS_WEIGHTS = (('Completed', 70), ('Pending', 20), ('Cancelled', 10))
+# Orders from the last RECENT_DAYS days have not all been fulfilled yet
+RECENT_DAYS = 7
+RECENT_STATUS_WEIGHTS = (('Completed', 35), ('Pending', 55), ('Cancelled', 10))
+
+RATING_WEIGHTS = ((1, 5), (2, 8), (3, 17), (4, 35), (5, 35))
+
+# Relative volume by weekday (Monday first)
+WEEKDAY_WEIGHTS = (1.0, 0.95, 0.95, 1.0, 1.1, 1.3, 1.2)
+
+# days_back = days * u ** RECENCY_SKEW: > 1 puts more rows in recent days
+RECENCY_SKEW = 1.6
+
+MAX_AMOUNT = 99999.99
+
+
+def _cumulative(pairs):
+    values = [value for value, _ in pairs]
+    return values, list(accumulate(weight for _, weight in pairs))
+
+
+_CATEGORIES, _CATEGORY_CUM = _cumulative(CATEGORY_WEIGHTS.items())
+_STATUSES, _STATUS_CUM = _cumulative(STATUS_WEIGHTS)
+_RECENT_STATUSES, _RECENT_STATUS_CUM = _cumulative(RECENT_STATUS_WEIGHTS)
+_RATINGS, _RATING_CUM = _cumulative(RATING_WEIGHTS)
+_AMOUNT_MU = {category: (math.log(median), sigma) for category, (median, sigma) in AMOUNT_PARAMS.items()}
+_MAX_WEEKDAY = max(WEEKDAY_WEIGHTS)
+
+
+def _chunk_rng(seed, chunk):
+    # String seeds are hashed with SHA-512: stable across runs and platforms
+    return random.Random(f'{seed}:{chunk}')
+
+
+def _generate_chunk(seed, chunk, anchor, days, limit=CHUNK_ROWS):
+    """The first `limit` rows of one chunk as (name, category, status, amount, date, rating)
+
+    The per-chunk draws come first, so a prefix is the same whatever `limit` is.
+    """
+    rng = _chunk_rng(seed, chunk)
+    random_ = rng.random
+    categories = rng.choices(_CATEGORIES, cum_weights=_CATEGORY_CUM, k=CHUNK_ROWS)
+    ratings = rng.choices(_RATINGS, cum_weights=_RATING_CUM, k=CHUNK_ROWS)
+    # Per day back: ISO date and weekday acceptance probability
+    day_text = [(anchor - timedelta(days=d)).isoformat() for d in range(days)]
+    day_accept = [WEEKDAY_WEIGHTS[(anchor - timedelta(days=d)).weekday()] / _MAX_WEEKDAY for d in range(days)]
+    rows = []
+    for i, category in enumerate(categories[:limit]):
+        # Recency skew, then weekday seasonality by rejection
+        while True:
+            days_back = int(days * random_() ** RECENCY_SKEW)
+            if random_() < day_accept[days_back]:
+                break
+        if days_back < RECENT_DAYS:
+            status = _RECENT_STATUSES[bisect.bisect(_RECENT_STATUS_CUM, random_() * _RECENT_STATUS_CUM[-1])]
+        else:
+            status = _STATUSES[bisect.bisect(_STATUS_CUM, random_() * _STATUS_CUM[-1])]
+        mu, sigma = _AMOUNT_MU[category]
+        amount = min(max(rng.lognormvariate(mu, sigma), 1.0), MAX_AMOUNT)
+        brands, nouns = NAME_PARTS[category]
+        name = f'{rng.choice(brands)} {rng.choice(nouns)} {chunk * CHUNK_ROWS + i + 1}'
+        rows.append((name, category, status, f'{amount:.2f}', day_text[days_back], ratings[i]))
+    return rows
+
+
+def generate_products(start, stop, seed=DEFAULT_SEED, anchor=None, days=DEFAULT_DAYS):
+    """Yield (index, values) for rows start <= index < stop of the data set.
+
+    `values` is (name, category, status, amount, date, rating) with amount
+    and date as strings, ready for product_io.copy_line.
+    """
+    anchor = anchor or date.today()
+    for chunk in range(start // CHUNK_ROWS, (stop + CHUNK_ROWS - 1) // CHUNK_ROWS):
+        first = chunk * CHUNK_ROWS
+        rows = _generate_chunk(seed, chunk, anchor, days, min(stop - first, CHUNK_ROWS))
+        for offset in range(max(start - first, 0), min(stop - first, CHUNK_ROWS)):
+            yield first + offset, rows[offset]
+
+
+def chunk_ranges(start, stop):
+    """[start, stop) split on chunk boundaries, the unit of work for parallel loads"""
+    return [
+        (max(start, chunk * CHUNK_ROWS), min(stop, (chunk + 1) * CHUNK_ROWS))
+        for chunk in range(start // CHUNK_ROWS, (stop + CHUNK_ROWS - 1) // CHUNK_ROWS)
+    ]
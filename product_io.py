@@ -0,0 +1,223 @@
+"""
+Reading, validating and encoding products for bulk import / export (CSV / NDJSON)
+"""
+
+import csv
+import io
+import json
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+PRODUCT_FIELDS = ('name', 'category', 'status', 'amount', 'date', 'rating')
+
+FORMATS = ('csv', 'ndjson')
+
+EXPORT_FIELDS = ('id',) + PRODUCT_FIELDS
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson'
+}
+
+# Column limits from the products table
+MAX_LENGTHS = {'name': 255, 'category': 100, 'status': 50}
+MAX_AMOUNT = Decimal('99999999.99')  # DECIMAL(10, 2)
+CENT = Decimal('0.01')
+
+
+def detect_format(content_type=None, filename=None):
+    """Guess the import format from a Content-Type or file name"""
+    content_type = (content_type or '').lower()
+    filename = (filename or '').lower()
+    if 'csv' in content_type or filename.endswith('.csv'):
+        return 'csv'
+    if 'ndjson' in content_type or 'jsonl' in content_type or 'json' in content_type:
+        return 'ndjson'
+    if filename.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    return None
+
+
+def read_records(stream, fmt):
+    """Yield (line_number, record, error) from a text stream.
+
+    `record` is a dict with PRODUCT_FIELDS keys, or None when the line
+    could not be parsed (then `error` says why).
+    """
+    if fmt == 'csv':
+        return _read_csv(stream)
+    if fmt == 'ndjson':
+        return _read_ndjson(stream)
+    raise ValueError(f'Unknown format: {fmt}')
+
+
+def _read_csv(stream):
+    reader = csv.DictReader(stream)
+    missing = [f for f in PRODUCT_FIELDS if f not in (reader.fieldnames or [])]
+    if missing:
+        yield 1, None, f'Missing CSV columns: {", ".join(missing)}'
+        return
+    for record in reader:
+        if None in record:
+            yield reader.line_num, None, f'Too many columns (expected {len(reader.fieldnames)})'
+            continue
+        yield reader.line_num, record, None
+
+
+def _read_ndjson(stream):
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, 'Expected a JSON object'
+            continue
+        yield line_number, record, None
+
+
+def _text(record, field, max_length):
+    value = record.get(field)
+    if value is None:
+        raise ValueError(f'"{field}" is required')
+    if value.__class__ is not str:
+        value = str(value)
+    value = value.strip()
+    if not value:
+        raise ValueError(f'"{field}" is required')
+    if len(value) > max_length:
+        raise ValueError(f'"{field}" is longer than {max_length} characters')
+    return value
+
+
+def _amount(value):
+    if value is None or value == '':
+        raise ValueError('"amount" is required')
+    if isinstance(value, str):
+        # Accept the display format ("$1,234.50") as well as plain numbers
+        if value.startswith('$') or ',' in value:
+            value = value.strip().lstrip('$').replace(',', '')
+    elif isinstance(value, float):
+        value = repr(value)
+    try:
+        amount = Decimal(value).quantize(CENT)
+    except (InvalidOperation, ValueError, TypeError):
+        # TypeError: JSON objects / arrays ({"amount": {}})
+        raise ValueError(f'"amount" is not a number: {value}')
+    if not amount.is_finite() or abs(amount) > MAX_AMOUNT:
+        raise ValueError(f'"amount" is out of range: {value}')
+    return amount
+
+
+def _date(value):
+    if isinstance(value, date):
+        return value
+    if not value:
+        raise ValueError('"date" is required')
+    value = str(value).strip()
+    try:
+        # Fast path for ISO dates, strptime is an order of magnitude slower
+        return date.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in ('%Y-%m-%d', '%m/%d/%Y'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f'"date" must be YYYY-MM-DD or MM/DD/YYYY: {value}')
+
+
+def _rating(value):
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(f'"rating" is not an integer: {value}')
+    try:
+        rating = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'"rating" is not an integer: {value}')
+    if not 1 <= rating <= 5:
+        raise ValueError(f'"rating" must be between 1 and 5: {value}')
+    return rating
+
+
+def validate_product(record):
+    """Validate a product record and return (name, category, status, amount, date, rating).
+
+    Raises ValueError with a human readable message for invalid records.
+    """
+    return (
+        _text(record, 'name', MAX_LENGTHS['name']),
+        _text(record, 'category', MAX_LENGTHS['category']),
+        _text(record, 'status', MAX_LENGTHS['status']),
+        _amount(record.get('amount')),
+        _date(record.get('date')),
+        _rating(record.get('rating'))
+    )
+
+
+# Characters that must be escaped in COPY text format
+_COPY_SPECIAL = re.compile(r'[\\\t\n\r]')
+
+
+def _copy_escape(value):
+    return (value.replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+def copy_line(values):
+    """Encode validated product values as one line of COPY text format"""
+    name, category, status, amount, date_value, rating = values
+    # One regex check per row; escaping is only needed for unusual names
+    if _COPY_SPECIAL.search(name + category + status):
+        text = f'{_copy_escape(name)}\t{_copy_escape(category)}\t{_copy_escape(status)}'
+    else:
+        text = f'{name}\t{category}\t{status}'
+    return f'{text}\t{amount}\t{date_value}\t{rating}\n'
+
+
+def encode_export(batches, fmt):
+    """Yield text chunks (one per batch) for rows in EXPORT_FIELDS order.
+
+    The output can be fed back to read_records: amounts are plain numbers
+    and dates are ISO formatted.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format: {fmt}')
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(EXPORT_FIELDS)
+        for rows in batches:
+            writer.writerows(
+                (pid, name, category, status, amount, day.isoformat(), rating)
+                for pid, name, category, status, amount, day, rating in rows
+            )
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        return
+
+    dumps = json.dumps
+    for rows in batches:
+        yield ''.join(
+            dumps({
+                'id': pid,
+                'name': name,
+                'category': category,
+                'status': status,
+                'amount': float(amount),
+                'date': day.isoformat(),
+                'rating': rating
+            }, ensure_ascii=False) + '\n'
+            for pid, name, category, status, amount, day, rating in rows
+        )
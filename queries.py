@@ -0,0 +1,589 @@
+"""
+SQL and result formatting shared by the sync (database.py) and async
+(async_database.py) data layers.
+
+Everything here is driver independent: queries use %s / %(name)s
+placeholders, which both psycopg2 and psycopg 3 understand, and the result
+builders take plain row tuples.
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta, date
+from decimal import Decimal
+
+
+def format_product(row):
+    """Format a products row (dict-like) for the frontend"""
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'category': row['category'],
+        'status': row['status'],
+        'amount': f"${float(row['amount']):.2f}",
+        'date': row['date'].strftime('%m/%d/%Y') if isinstance(row['date'], (datetime, date)) else str(row['date']),
+        'rating': row['rating']
+    }
+
+
+# Keys of a product in API responses, in select-list order
+PRODUCT_KEYS = ('id', 'name', 'category', 'status', 'amount', 'date', 'rating')
+
+# Select lists that format a product in PostgreSQL, so rows come back as
+# plain tuples of str / int / float in PRODUCT_KEYS order and Python only
+# zips them with the keys:
+#   display - what the table shows ("$1234.50", "MM/DD/YYYY"), same as format_product
+#   raw     - numeric amount and ISO date for API clients
+PRODUCT_COLUMNS = {
+    'display': "id, name, category, status, '$' || amount::text AS amount, "
+               "to_char(date, 'MM/DD/YYYY') AS date, rating",
+    'raw': "id, name, category, status, amount::float8 AS amount, "
+           "to_char(date, 'YYYY-MM-DD') AS date, rating"
+}
+PRODUCT_FORMATS = tuple(PRODUCT_COLUMNS)
+
+
+def product_columns(fmt=None):
+    """Select list for a product format (raises ValueError)"""
+    try:
+        return PRODUCT_COLUMNS[fmt or 'display']
+    except KeyError:
+        raise ValueError(f'Unknown product format "{fmt}", use one of: {", ".join(PRODUCT_FORMATS)}')
+
+
+def product_dicts(rows):
+    """Turn PRODUCT_COLUMNS tuples into response dicts"""
+    keys = PRODUCT_KEYS
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def _parse_list(parser):
+    """Parser for comma separated values ("Books,Food")"""
+    def parse(value):
+        items = [item.strip() for item in value.split(',') if item.strip()]
+        if not items:
+            raise ValueError(value)
+        return [parser(item) for item in items]
+    return parse
+
+
+def _parse_amount(value):
+    amount = Decimal(value)
+    if not amount.is_finite():
+        raise ValueError(value)
+    return amount
+
+
+# Whitelisted filters for product listings: query parameter -> (SQL
+# condition, value parser). Values are always bound as parameters.
+PRODUCT_FILTERS = {
+    'category': ('category = ANY(%s)', _parse_list(str)),
+    'status': ('status = ANY(%s)', _parse_list(str)),
+    'rating': ('rating = ANY(%s)', _parse_list(int)),
+    'date_from': ('date >= %s', date.fromisoformat),
+    'date_to': ('date <= %s', date.fromisoformat),
+    'amount_min': ('amount >= %s', _parse_amount),
+    'amount_max': ('amount <= %s', _parse_amount)
+}
+
+# Whitelisted sort fields: name -> parser for the value stored in cursors.
+# Every order ends with id so pages are stable.
+PRODUCT_SORTS = {
+    'id': int,
+    'name': str,
+    'category': str,
+    'status': str,
+    'amount': _parse_amount,
+    'date': date.fromisoformat,
+    'rating': int
+}
+DEFAULT_SORT = 'id'
+
+
+def parse_product_filters(args):
+    """Pick the whitelisted filters out of query args as {name: value} (raises ValueError)"""
+    filters = {}
+    for name, (_, parser) in PRODUCT_FILTERS.items():
+        value = args.get(name)
+        if value is None or value == '':
+            continue
+        try:
+            filters[name] = parser(value)
+        except (ValueError, ArithmeticError):
+            raise ValueError(f'Invalid value for "{name}": {value}')
+    return filters
+
+
+def parse_sort(sort=None):
+    """Parse 'date' / '-date' into (field, descending) (raises ValueError)"""
+    sort = (sort or DEFAULT_SORT).strip()
+    descending = sort.startswith('-')
+    field = sort[1:] if descending else sort
+    if field not in PRODUCT_SORTS:
+        raise ValueError(f'Invalid sort "{sort}", use one of: {", ".join(PRODUCT_SORTS)} (prefix "-" for descending)')
+    return field, descending
+
+
+def product_conditions(filters):
+    """SQL conditions and params for parsed filters"""
+    filters = filters or {}
+    conditions = [PRODUCT_FILTERS[name][0] for name in filters]
+    return conditions, list(filters.values())
+
+
+def _where(conditions):
+    return 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+
+
+def _order(field, descending):
+    # Qualified: a bare "amount" / "date" would mean the formatted output column
+    direction = 'DESC' if descending else 'ASC'
+    if field == 'id':
+        return f'ORDER BY products.id {direction}'
+    return f'ORDER BY products.{field} {direction}, products.id {direction}'
+
+
+def page_query(limit, offset, fmt=None, filters=None, sort=None):
+    """SQL and params for one OFFSET page of products"""
+    field, descending = parse_sort(sort)
+    conditions, params = product_conditions(filters)
+    sql = f'SELECT {product_columns(fmt)} FROM products {_where(conditions)} {_order(field, descending)} LIMIT %s OFFSET %s'
+    return sql, params + [limit, offset]
+
+
+def product_by_id_query(product_id, fmt=None):
+    """SQL and params for one product with its row version (xmin)"""
+    return f'SELECT {product_columns(fmt)}, xmin::text FROM products WHERE id = %s', [product_id]
+
+
+def count_query(filters=None):
+    """SQL and params counting the products that match `filters`"""
+    conditions, params = product_conditions(filters)
+    return f'SELECT COUNT(*) FROM products {_where(conditions)}', params
+
+
+def estimate_query(filters=None):
+    """EXPLAIN whose top plan node carries the planner's row estimate for `filters`"""
+    conditions, params = product_conditions(filters)
+    return f'EXPLAIN (FORMAT JSON) SELECT 1 FROM products {_where(conditions)}', params
+
+
+def plan_rows(plan):
+    """Row estimate from the result of estimate_query"""
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def encode_cursor(product_id, sort=None, sort_value=None):
+    """Encode a position in a listing as an opaque pagination cursor.
+
+    The default (id) order uses "id:<id>"; other orders also carry the
+    sort value of the row: "<sort>:<id>:<value>".
+    """
+    if sort in (None, 'id'):
+        raw = f'id:{product_id}'
+    else:
+        if isinstance(sort_value, date):
+            sort_value = sort_value.isoformat()
+        raw = f'{sort}:{product_id}:{sort_value}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort=None):
+    """Decode a cursor into its sort key: (id,) or (sort value, id) (raises ValueError)"""
+    field, _ = parse_sort(sort)
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        prefix, rest = raw.split(':', 1)
+        if prefix != field:
+            raise ValueError(raw)
+        if field == 'id':
+            return (int(rest),)
+        product_id, value = rest.split(':', 1)
+        return PRODUCT_SORTS[field](value), int(product_id)
+    except (ValueError, ArithmeticError, UnicodeError, TypeError) as e:
+        raise ValueError(f'Invalid cursor for sort "{field}": {token}') from e
+
+
+def keyset_query(limit, after=None, before=None, fmt=None, filters=None, sort=None):
+    """SQL and params for one keyset page (fetches one extra row to detect more pages).
+
+    `after` / `before` are keys from decode_cursor. The row comparison
+    follows the ORDER BY, so an index on (sort column, id) can seek
+    straight to the key.
+    """
+    field, descending = parse_sort(sort)
+    columns = product_columns(fmt)
+    key_columns = 'id'
+    if field != 'id':
+        # The raw sort value rides along after the product columns for the cursors
+        columns = f'{columns}, products.{field}'
+        key_columns = f'{field}, id'
+
+    conditions, params = product_conditions(filters)
+    key = before if before is not None else after
+    if key is not None:
+        forward = before is None
+        op = '<' if descending == forward else '>'
+        conditions.append(f'({key_columns}) {op} ({", ".join(["%s"] * len(key))})')
+        params += list(key)
+
+    # Walk backwards from `before`; keyset_page restores the order
+    order = _order(field, descending if before is None else not descending)
+    return f'SELECT {columns} FROM products {_where(conditions)} {order} LIMIT %s', params + [limit + 1]
+
+
+def keyset_page(rows, limit, after=None, before=None, sort=None):
+    """Build {data, next_cursor, prev_cursor} from the rows of keyset_query"""
+    field, _ = parse_sort(sort)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+
+    def cursor(row):
+        if field == 'id':
+            return encode_cursor(row[0])
+        return encode_cursor(row[0], field, row[len(PRODUCT_KEYS)])
+
+    next_cursor = None
+    prev_cursor = None
+    if rows:
+        if before is not None:
+            # We came from a later page, so it exists
+            next_cursor = cursor(rows[-1])
+            prev_cursor = cursor(rows[0]) if has_more else None
+        else:
+            next_cursor = cursor(rows[-1]) if has_more else None
+            prev_cursor = cursor(rows[0]) if after is not None else None
+
+    return {
+        'data': product_dicts(rows),
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
+    }
+
+
+# Substring search needs at least one trigram to use the pg_trgm index
+SEARCH_MIN_SUBSTRING = 3
+
+
+def _like_escape(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_prefix_query(q, limit, fmt=None):
+    """(sql, params) for names starting with `q`, in name order.
+
+    Served by the C-collated lower(name) index, which covers both the
+    LIKE 'abc%' range and the ORDER BY.
+    """
+    return (
+        f'SELECT {product_columns(fmt)} FROM products '
+        'WHERE lower(name) COLLATE "C" LIKE %s '
+        'ORDER BY lower(name) COLLATE "C", id LIMIT %s',
+        (_like_escape(q.lower()) + '%', limit)
+    )
+
+
+def search_substring_query(q, limit, fmt=None):
+    """(sql, params) for names containing `q` but not starting with it, or None if `q` is too short.
+
+    ILIKE is served by the pg_trgm GIN index when the extension is
+    installed. There is no ORDER BY so the scan stops after `limit` rows;
+    search_result sorts them.
+    """
+    if len(q) < SEARCH_MIN_SUBSTRING:
+        return None
+    term = _like_escape(q.lower())
+    return (
+        f'SELECT {product_columns(fmt)} FROM products '
+        'WHERE name ILIKE %s AND lower(name) COLLATE "C" NOT LIKE %s LIMIT %s',
+        ('%' + term + '%', term + '%', limit)
+    )
+
+
+def search_result(prefix_rows, substring_rows, limit):
+    """Prefix matches first, then substring matches, both by name"""
+    substring_rows = sorted(substring_rows, key=lambda row: (row[1].lower(), row[0]))
+    return product_dicts((list(prefix_rows) + substring_rows)[:limit])
+
+
+COUNT_SQL = 'SELECT COUNT(*) FROM products'
+
+COUNTER_SQL = "SELECT row_count FROM row_counts WHERE table_name = 'products'"
+
+# Sum over the leaf tables, so a partitioned products is estimated too;
+# reltuples is -1 before the first VACUUM/ANALYZE, counted as 0
+ESTIMATE_SQL = """
+    SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::BIGINT
+    FROM pg_partition_tree('products') t
+    JOIN pg_class c ON c.oid = t.relid
+    WHERE t.isleaf
+"""
+
+DATA_VERSION_SQL = """
+    SELECT version, CURRENT_DATE FROM table_versions
+    WHERE table_name = 'products'
+"""
+
+
+def data_version(row):
+    """Data version token from a DATA_VERSION_SQL row"""
+    if not row:
+        return None
+    # Charts are relative to today, so the date is part of the version
+    return f'{row[0]}-{row[1].isoformat()}'
+
+
+# Line chart buckets: name -> (date_trunc unit, step interval, label format)
+LINE_CHART_BUCKETS = {
+    'day': ('day', '1 day', '%d %b'),
+    'week': ('week', '7 days', '%d %b'),
+    'month': ('month', '1 month', '%b %Y')
+}
+DEFAULT_LINE_CHART_BUCKET = '3d'
+MAX_LINE_CHART_BUCKETS = 1000
+
+
+def parse_bucket(bucket):
+    """Parse a line chart bucket ('day', 'week', 'month', 'Nd' or 'N') (raises ValueError)"""
+    bucket = (bucket or DEFAULT_LINE_CHART_BUCKET).strip().lower()
+    if bucket in LINE_CHART_BUCKETS:
+        return LINE_CHART_BUCKETS[bucket]
+    days = bucket[:-1] if bucket.endswith('d') else bucket
+    if days.isdigit() and 0 < int(days) <= 366:
+        return 'day', f'{int(days)} days', '%d %b'
+    raise ValueError(f'Invalid bucket: {bucket}')
+
+
+def estimate_bucket_count(date_from, date_to, bucket):
+    """Upper bound of the number of buckets between two dates"""
+    trunc, step, _ = parse_bucket(bucket)
+    days = (date_to - date_from).days + 1
+    if trunc == 'month':
+        return days // 28 + 1
+    return days // int(step.split()[0]) + 1
+
+
+LINE_CHART_SQL = """
+    WITH bounds AS (
+        SELECT
+            COALESCE(%(date_from)s::date, CURRENT_DATE - 31) AS date_from,
+            COALESCE(%(date_to)s::date, CURRENT_DATE) AS date_to
+    )
+    SELECT
+        to_char(m, 'YYYY-MM-DD') as day,
+        COALESCE(SUM(d.total_amount), 0) as total
+    FROM bounds
+    CROSS JOIN generate_series(
+        date_trunc(%(trunc)s, bounds.date_from::timestamp),
+        bounds.date_to::timestamp,
+        %(step)s::interval
+    ) AS m
+    LEFT JOIN daily_sales d
+        ON d.status = 'Completed'
+        AND d.day >= GREATEST(m, bounds.date_from)
+        AND d.day < m + %(step)s::interval
+        AND d.day <= bounds.date_to
+    GROUP BY m
+    ORDER BY m;
+"""
+
+
+def line_chart_query(date_from=None, date_to=None, bucket=None):
+    """Validate line chart arguments and return (params, label_format) for LINE_CHART_SQL.
+
+    Raises ValueError for an unknown bucket, reversed dates or a range
+    that would produce more than MAX_LINE_CHART_BUCKETS buckets.
+    """
+    trunc, step, label_format = parse_bucket(bucket)
+    if date_from or date_to:
+        # Missing bounds default to the database's CURRENT_DATE; the
+        # local date is close enough for validation
+        check_to = date_to or date.today()
+        check_from = date_from or check_to - timedelta(days=31)
+        if check_from > check_to:
+            raise ValueError('"from" must not be after "to"')
+        if estimate_bucket_count(check_from, check_to, bucket) > MAX_LINE_CHART_BUCKETS:
+            raise ValueError(f'Too many buckets (max {MAX_LINE_CHART_BUCKETS}), use a larger bucket')
+    params = {
+        'date_from': date_from,
+        'date_to': date_to,
+        'trunc': trunc,
+        'step': step
+    }
+    return params, label_format
+
+
+def line_chart_result(rows, label_format):
+    """Build {labels, data} from LINE_CHART_SQL rows"""
+    labels = []
+    data = []
+    for row in rows:
+        day_str = row[0]  # 'YYYY-MM-DD'
+        date_obj = datetime.strptime(day_str, '%Y-%m-%d')
+        labels.append(date_obj.strftime(label_format))
+        data.append(float(row[1]))
+    return {'labels': labels, 'data': data}
+
+
+BAR_CHART_SQL = """
+    SELECT
+        category,
+        COUNT(*) as count
+    FROM products
+    GROUP BY category
+    ORDER BY count DESC
+"""
+
+PIE_CHART_SQL = """
+    SELECT
+        status,
+        COUNT(*) as count
+    FROM products
+    GROUP BY status
+"""
+
+
+def count_chart_result(rows):
+    """Build {labels, data} from (label, count) rows"""
+    return {
+        'labels': [row[0] for row in rows],
+        'data': [int(row[1]) for row in rows]
+    }
+
+
+# The trailing row (grouping id 0b111) always carries CURRENT_DATE, even
+# when products is empty and GROUPING SETS returns nothing
+DASHBOARD_SQL = """
+    SELECT
+        GROUPING(category, status, sale_day) AS grouping_id,
+        category,
+        status,
+        sale_day,
+        COUNT(*) AS count,
+        COALESCE(SUM(amount), 0) AS total,
+        CURRENT_DATE AS today
+    FROM (
+        SELECT
+            category,
+            status,
+            amount,
+            CASE
+                WHEN status = 'Completed'
+                    AND date >= CURRENT_DATE - 31
+                    AND date <= CURRENT_DATE
+                THEN date
+            END AS sale_day
+        FROM products
+    ) p
+    GROUP BY GROUPING SETS ((category), (status), (sale_day))
+    UNION ALL
+    SELECT 7, NULL, NULL, NULL, 0, 0, CURRENT_DATE
+"""
+
+
+def dashboard_result(rows):
+    """Build {line, bar, pie} from DASHBOARD_SQL rows"""
+    # GROUPING() bits are (category, status, sale_day); a 0 bit marks
+    # the column the row is grouped by
+    by_category = []
+    by_status = []
+    sales_by_day = {}
+    today = None
+    for grouping_id, category, status, sale_day, count, total, row_today in rows:
+        today = row_today
+        if grouping_id == 0b011:
+            by_category.append((category, int(count)))
+        elif grouping_id == 0b101:
+            by_status.append((status, int(count)))
+        elif grouping_id == 0b110 and sale_day is not None:
+            sales_by_day[sale_day] = float(total)
+
+    # Same default series as the line chart: 3-day buckets, each summing
+    # every day it covers
+    labels = []
+    data = []
+    day = today - timedelta(days=31)
+    while day <= today:
+        labels.append(day.strftime('%d %b'))
+        data.append(sum(
+            sales_by_day.get(day + timedelta(days=offset), 0.0)
+            for offset in range(3)
+        ))
+        day += timedelta(days=3)
+
+    by_category.sort(key=lambda item: item[1], reverse=True)
+
+    return {
+        'line': {'labels': labels, 'data': data},
+        'bar': {
+            'labels': [item[0] for item in by_category],
+            'data': [item[1] for item in by_category]
+        },
+        'pie': {
+            'labels': [item[0] for item in by_status],
+            'data': [item[1] for item in by_status]
+        }
+    }
+
+
+def _hot_statements():
+    statements = [
+        ('products_count', COUNT_SQL, None),
+        ('products_counter', COUNTER_SQL, None),
+        ('products_estimate', ESTIMATE_SQL, None),
+        ('data_version', DATA_VERSION_SQL, None),
+        ('line_chart', LINE_CHART_SQL, ('date_from', 'date_to', 'trunc', 'step')),
+        ('bar_chart', BAR_CHART_SQL, None),
+        ('pie_chart', PIE_CHART_SQL, None),
+        ('dashboard', DASHBOARD_SQL, None),
+    ]
+    for fmt in PRODUCT_FORMATS:
+        statements += [
+            (f'product_by_id_{fmt}', product_by_id_query(0, fmt)[0], None),
+            (f'products_page_{fmt}', page_query(0, 0, fmt)[0], None),
+            (f'products_first_{fmt}', keyset_query(0, fmt=fmt)[0], None),
+            (f'products_after_{fmt}', keyset_query(0, after=(0,), fmt=fmt)[0], None),
+            (f'products_before_{fmt}', keyset_query(0, before=(0,), fmt=fmt)[0], None),
+        ]
+
+    prepared = {}
+    for name, sql, names in statements:
+        count = len(names) if names else sql.count('%s')
+        arguments = f' ({", ".join(["%s"] * count)})' if count else ''
+        prepared[sql] = (name, names, f'EXECUTE {name}{arguments}')
+    return prepared
+
+
+# Hot statements the sync layer prepares once per pooled connection
+# (DB_PREPARED_STATEMENTS): text SQL -> (statement name, parameter names
+# of %(name)s queries, EXECUTE template). Listings with filters or a
+# non-default sort are built per request and stay plain text.
+PREPARED_STATEMENTS = _hot_statements()
+
+
+def prepare_statement_sql(sql):
+    """PREPARE command for a PREPARED_STATEMENTS query (placeholders become $1, $2, ...)"""
+    name, names, _ = PREPARED_STATEMENTS[sql]
+    if names:
+        for number, key in enumerate(names, 1):
+            sql = sql.replace(f'%({key})s', f'${number}')
+    else:
+        parts = sql.split('%s')
+        sql = parts[0] + ''.join(f'${number}{part}' for number, part in enumerate(parts[1:], 1))
+    return f'PREPARE {name} AS {sql.strip().rstrip(";")}'
+
+
+def prepared_call(sql, params=None):
+    """(statement name, EXECUTE sql, params) for a PREPARED_STATEMENTS query, or None"""
+    statement = PREPARED_STATEMENTS.get(sql)
+    if statement is None:
+        return None
+    name, names, execute_sql = statement
+    if names:
+        params = [params[key] for key in names]
+    return name, execute_sql, params or None
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Скрипт для пересчёта сводной таблицы daily_sales из таблицы products
+"""
+
+import logging
+from dotenv import load_dotenv
+from database import Database
+
+# Load environment variables
+load_dotenv()
+# Database messages go to the console as plain lines
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+# Initialize database
+db = Database()
+db.init()
+
+try:
+    rows = db.rebuild_daily_sales()
+    print(f"Таблица daily_sales пересчитана: {rows} строк (день × статус)")
+except Exception as e:
+    print(f"Ошибка: {e}")
+finally:
+    db.close()
@@ -0,0 +1,213 @@
+"""
+Read replica routing shared by the sync (database.py) and async
+(async_database.py) data layers.
+
+DB_REPLICA_DSNS lists the replicas, separated by ";": full libpq DSNs or
+URIs, or just host[:port] to reuse the primary's database and
+credentials. Each replica gets its own pool in each process. Methods
+decorated with replica_read take their connection from a replica picked
+round-robin; everything else (writes included) uses the primary. After
+hold_replica() the reads of a context (the apps call it per request)
+all use the server the first one went to, so an ETag built from the data
+version matches the rows read next.
+
+Reads stay on the primary:
+- for DB_READ_YOUR_WRITES seconds (2) after a write in this process;
+- in a context pinned with pin_primary() (the apps pin requests from
+  clients that wrote recently, which covers the other server processes);
+- when no replica is available. A replica that cannot be reached or
+  fails mid-query is skipped for DB_REPLICA_RETRY seconds (5), and the
+  read is retried on the primary.
+"""
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import itertools
+import logging
+import math
+import os
+import time
+from psycopg2.extensions import make_dsn, parse_dsn
+
+logger = logging.getLogger(__name__)
+
+# Set on write responses: the client's next reads go to the primary
+PRIMARY_COOKIE = 'read_primary'
+WRITE_METHODS = frozenset(('POST', 'PUT', 'PATCH', 'DELETE'))
+
+# Set by replica_read for the duration of a read-only call; records the
+# replica that served it
+_route = contextvars.ContextVar('replica_route', default=None)
+_pinned = contextvars.ContextVar('primary_pinned', default=False)
+# Set by hold_replica; records the server the context's first read used
+_held = contextvars.ContextVar('replica_held', default=None)
+
+
+def replica_dsns(primary_dsn):
+    """DSNs listed in DB_REPLICA_DSNS (a bare host[:port] inherits the rest from `primary_dsn`)"""
+    dsns = []
+    for item in os.getenv('DB_REPLICA_DSNS', '').split(';'):
+        item = item.strip()
+        if not item:
+            continue
+        if '=' in item or '://' in item:
+            dsns.append(item)
+            continue
+        params = parse_dsn(primary_dsn)
+        host, sep, port = item.rpartition(':')
+        if sep and port.isdigit():
+            params.update(host=host, port=port)
+        else:
+            params['host'] = item
+        dsns.append(make_dsn(**params))
+    return dsns
+
+
+def pin_primary(pinned=True):
+    """Send the reads of the current request (context) to the primary"""
+    _pinned.set(pinned)
+
+
+def hold_replica():
+    """Serve the following reads of the current request (context) from one server"""
+    _held.set({})
+
+
+@contextlib.contextmanager
+def holding_replica():
+    """hold_replica() for the reads inside the block (a hold already in place is kept)"""
+    if _held.get() is not None:
+        yield
+        return
+    token = _held.set({})
+    try:
+        yield
+    finally:
+        _held.reset(token)
+
+
+class Replica:
+    def __init__(self, dsn, connection_pool):
+        params = parse_dsn(dsn)
+        # Shown in logs and stats, so no credentials
+        self.name = f"{params.get('host', 'localhost')}:{params.get('port', 5432)}"
+        self.connection_pool = connection_pool
+        self.down_until = 0.0
+        self.reads = 0
+        self.failures = 0
+
+    @property
+    def available(self):
+        return time.monotonic() >= self.down_until
+
+
+class ReplicaSet:
+    """The replicas of one data layer, with round-robin and failure back-off"""
+
+    def __init__(self, replicas=()):
+        self.replicas = list(replicas)
+        self.read_your_writes = float(os.getenv('DB_READ_YOUR_WRITES', 2))
+        self.retry_seconds = float(os.getenv('DB_REPLICA_RETRY', 5))
+        self.connect_timeout = int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', 2))
+        self._last_write = float('-inf')
+        self._counter = itertools.count()
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def wrote(self):
+        """Keep this process's reads on the primary for the read-your-writes window"""
+        self._last_write = time.monotonic()
+
+    @property
+    def cookie_max_age(self):
+        """Lifetime of PRIMARY_COOKIE in whole seconds (0: no cookie)"""
+        return math.ceil(self.read_your_writes) if self.replicas else 0
+
+    def candidates(self):
+        """Available replicas in round-robin order, empty when the read must use the primary"""
+        if not self.replicas or _route.get() is None or _pinned.get():
+            return []
+        if time.monotonic() - self._last_write < self.read_your_writes:
+            return []
+        held = _held.get()
+        if held:
+            # An earlier read of this context went there; None is the primary
+            replica = held['replica']
+            return [replica] if replica is not None and replica.available else []
+        start = next(self._counter)
+        count = len(self.replicas)
+        ordered = (self.replicas[(start + i) % count] for i in range(count))
+        return [replica for replica in ordered if replica.available]
+
+    def served(self, replica):
+        """`replica` (None: the primary) handed out the connection for the current read"""
+        route = _route.get()
+        if route is None:
+            return
+        held = _held.get()
+        if held is not None:
+            held.setdefault('replica', replica)
+        if replica is not None:
+            replica.reads += 1
+            route['replica'] = replica
+
+    def failed(self, replica, error):
+        """Skip `replica` for retry_seconds"""
+        replica.failures += 1
+        replica.down_until = time.monotonic() + self.retry_seconds
+        message = str(error).strip().splitlines()
+        logger.warning(
+            'Replica %s unavailable, reading from the primary for %.0f s: %s',
+            replica.name, self.retry_seconds, message[0] if message else type(error).__name__
+        )
+
+    def stats(self):
+        return [
+            {'name': r.name, 'available': r.available, 'reads': r.reads, 'failures': r.failures}
+            for r in self.replicas
+        ]
+
+
+def replica_read(method):
+    """Run a read-only data layer method on a replica, retrying on the primary if the replica fails.
+
+    The instance provides `replica_set` and `replica_errors` (the driver's
+    connection-level exceptions). Nested calls share the outer routing.
+    """
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            if not self.replica_set or _route.get() is not None:
+                return await method(self, *args, **kwargs)
+            route = {}
+            token = _route.set(route)
+            try:
+                return await method(self, *args, **kwargs)
+            except self.replica_errors as e:
+                if 'replica' not in route:
+                    raise
+                self.replica_set.failed(route['replica'], e)
+            finally:
+                _route.reset(token)
+            return await method(self, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.replica_set or _route.get() is not None:
+            return method(self, *args, **kwargs)
+        route = {}
+        token = _route.set(route)
+        try:
+            return method(self, *args, **kwargs)
+        except self.replica_errors as e:
+            if 'replica' not in route:
+                raise
+            self.replica_set.failed(route['replica'], e)
+        finally:
+            _route.reset(token)
+        return method(self, *args, **kwargs)
+    return wrapper
@@ -31,11 +31,15 @@ async function loadCharts() {
             }
         }
 
-        const [lineData, barData, pieData] = await Promise.all([
-            fetchChart('/charts/line'),
-            fetchChart('/charts/bar'),
-            fetchChart('/charts/pie')
-        ]);
+        // One request for all charts; fall back to the per-chart endpoints
+        const dashboard = await fetchChart('/dashboard');
+        const [lineData, barData, pieData] = dashboard
+            ? [dashboard.line, dashboard.bar, dashboard.pie]
+            : await Promise.all([
+                fetchChart('/charts/line'),
+                fetchChart('/charts/bar'),
+                fetchChart('/charts/pie')
+            ]);
 
         console.log('Chart Data Received:', { lineData, barData, pieData });
 
@@ -0,0 +1,104 @@
+"""
+Chart snapshots served stale-while-revalidate, shared by the sync
+(database.py) and async (async_database.py) data layers.
+
+The chart endpoints answer from the latest snapshot of each chart query
+(chart_snapshot) without touching the database. A background refresher
+(a thread, or a task in the async app) wakes every CHART_REFRESH_INTERVAL
+seconds (2), and right after a write in this process, reads the data
+version and recomputes, one at a time, the snapshots taken at an older
+version or more than CHART_SNAPSHOT_MAX_AGE seconds (300) ago. Requests
+keep getting the previous snapshot meanwhile. Snapshots nobody asked for
+in CHART_SNAPSHOT_IDLE seconds (600) are dropped instead of refreshed.
+
+The first request for a chart (or for a new set of line chart
+parameters) computes it inline; concurrent requests for the same chart
+wait for that single computation. CHART_REFRESH_INTERVAL=0 turns
+snapshots off: charts are computed per request through the query cache.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class Snapshot:
+    """A chart result, the data version it was computed at and when"""
+
+    __slots__ = ('value', 'version', 'generated_at', 'computed', 'used')
+
+    def __init__(self, value, version):
+        self.value = value
+        self.version = version
+        self.generated_at = datetime.now(timezone.utc)
+        self.computed = self.used = time.monotonic()
+
+    def payload(self):
+        """Response body: the chart data plus generatedAt (ISO 8601, UTC)"""
+        generated_at = self.generated_at.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+        return dict(self.value, generatedAt=generated_at)
+
+
+class SnapshotStore:
+    """Snapshots by (method name, args); the refreshing itself lives in the data layers"""
+
+    def __init__(self):
+        self.interval = float(os.getenv('CHART_REFRESH_INTERVAL', 2))
+        self.max_age = float(os.getenv('CHART_SNAPSHOT_MAX_AGE', 300))
+        self.idle = float(os.getenv('CHART_SNAPSHOT_IDLE', 600))
+        self.max_size = int(os.getenv('CHART_CACHE_SIZE', 128))
+        self.refreshes = 0
+        self.failures = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def get(self, key):
+        """Latest snapshot for `key`, or None"""
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                snapshot.used = time.monotonic()
+            return snapshot
+
+    def put(self, key, snapshot, refresh=False):
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None:
+                snapshot.used = previous.used
+            self._entries[key] = snapshot
+            if refresh:
+                self.refreshes += 1
+            if len(self._entries) > self.max_size:
+                # Drop the least recently requested
+                oldest = min(self._entries, key=lambda k: self._entries[k].used)
+                del self._entries[oldest]
+
+    def due(self, version):
+        """Keys to recompute now that the data version is `version`; forgets idle snapshots"""
+        now = time.monotonic()
+        keys = []
+        with self._lock:
+            for key, snapshot in list(self._entries.items()):
+                if now - snapshot.used > self.idle:
+                    del self._entries[key]
+                elif snapshot.version != version or now - snapshot.computed >= self.max_age:
+                    keys.append(key)
+        return keys
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            ages = [now - snapshot.computed for snapshot in self._entries.values()]
+            return {
+                'enabled': self.enabled,
+                'interval': self.interval,
+                'size': len(self._entries),
+                'refreshes': self.refreshes,
+                'failures': self.failures,
+                'oldest_seconds': round(max(ages), 3) if ages else None
+            }